@@ -20,14 +20,27 @@ class OllamaConfig:
     @staticmethod
     def get_config(is_docker: bool) -> dict:
         """Get Ollama configuration as a dictionary"""
+        # Model options forwarded to the Ollama server, unset ones keep the server defaults
+        options = {
+            "num_ctx": os.getenv("OLLAMA_NUM_CTX"),
+            "num_predict": os.getenv("OLLAMA_NUM_PREDICT"),
+            "num_thread": os.getenv("OLLAMA_NUM_THREAD"),
+        }
+
         return {
             "model": os.getenv("OLLAMA_MODEL", "qwen3:latest"),
             "base_url": os.getenv("OLLAMA_BASE_URL_LOCAL") if not is_docker else os.getenv("OLLAMA_BASE_URL_DOCKER"),
-            "base_url": os.getenv("OLLAMA_BASE_URL_LOCAL"),
             "context_window": os.getenv("OLLAMA_CONTEXT_WINDOW"),
             "max_tokens": os.getenv("OLLAMA_MAX_TOKENS"),
             "temperature": os.getenv("OLLAMA_TEMPERATURE"),
             "request_timeout": os.getenv("OLLAMA_REQUEST_TIMEOUT"),
+            # How long the server keeps the model loaded after a request, e.g. "30m", or "-1m" to keep it loaded
+            "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+            # Load the model at startup instead of on the first user request
+            "warmup": os.getenv("OLLAMA_WARMUP", "true").lower() == "true",
+            # Idle seconds before the pooled HTTP connection to Ollama is closed
+            "http_keepalive_expiry": float(os.getenv("OLLAMA_HTTP_KEEPALIVE_EXPIRY", "300")),
+            "additional_kwargs": {name: int(value) for name, value in options.items() if value},
         }
 
 
@@ -45,3 +58,120 @@ class DatabaseConfig:
             "password": os.getenv("DB_PASSWORD", "password"),
         }
     
+
+
+
+class QueryGuardConfig:
+    """Statement timeout and planner cost limits for agent-generated queries"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get query guard configuration as a dictionary"""
+        # Bulk transfers of whole tables run without a timeout unless overridden, the default would cut them off
+        tool_timeouts = {"export_table": 0, "import_file": 0}
+        # Per-tool overrides, e.g. "get_all_records_by_criterion=5000,delete_records_by_criteria=10000"
+        for entry in os.getenv("DB_TOOL_STATEMENT_TIMEOUTS_MS", "").split(","):
+            if "=" in entry:
+                tool_name, timeout_ms = entry.split("=", 1)
+                tool_timeouts[tool_name.strip()] = int(timeout_ms)
+
+        return {
+            "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")),
+            "tool_statement_timeouts_ms": tool_timeouts,
+            # Upper bound on EXPLAIN's total cost estimate, 0 disables the check
+            "max_query_cost": float(os.getenv("DB_MAX_QUERY_COST", "1000000")),
+        }
+
+
+class ResultSpillConfig:
+    """Spilling of large query results to local files"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get result spill configuration as a dictionary"""
+        return {
+            "spill_dir": Path(os.getenv("RESULT_SPILL_DIR", Path.cwd() / ".result_spill")),
+            # Results whose approximate in-memory size passes this are written to disk instead of returned inline
+            "threshold_bytes": int(os.getenv("RESULT_SPILL_THRESHOLD_BYTES", "262144")),
+            "fetch_batch_size": int(os.getenv("RESULT_SPILL_FETCH_BATCH_SIZE", "2000")),
+            "max_page_rows": int(os.getenv("RESULT_SPILL_MAX_PAGE_ROWS", "200")),
+            "ttl_seconds": int(os.getenv("RESULT_SPILL_TTL_SECONDS", "3600")),
+        }
+
+
+class ChangeFeedConfig:
+    """Trigger-based change feeds of watched tables"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get change feed configuration as a dictionary"""
+        return {
+            # Changes returned by one get_changes call, the rest is fetched with the returned cursor
+            "max_changes": int(os.getenv("CHANGE_FEED_MAX_CHANGES", "500")),
+            # Upper bound for how long get_changes waits for a NOTIFY when there are no changes yet
+            "max_wait_seconds": float(os.getenv("CHANGE_FEED_MAX_WAIT_SECONDS", "30")),
+            # Logged changes older than this are deleted
+            "retention_seconds": int(os.getenv("CHANGE_FEED_RETENTION_SECONDS", "86400")),
+        }
+
+
+class McpServerConfig:
+    """MCP server workers from environment variables"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get MCP server configuration as a dictionary"""
+        host = os.getenv("MCP_HOST", "127.0.0.1")
+        base_port = int(os.getenv("MCP_PORT", "8000"))
+        # Worker i listens on base_port + i
+        workers = int(os.getenv("MCP_WORKERS", "1"))
+        return {
+            "host": host,
+            "base_port": base_port,
+            "workers": workers,
+            "urls": [f"http://{host}:{base_port + worker}" for worker in range(workers)],
+            "startup_timeout": float(os.getenv("MCP_STARTUP_TIMEOUT", "30")),
+            "health_check_interval": float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "10")),
+        }
+
+
+class SchemaPrefetchConfig:
+    """Speculative schema prefetch for tables named in a request"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get schema prefetch configuration as a dictionary"""
+        return {
+            "enabled": os.getenv("SCHEMA_PREFETCH", "true").lower() == "true",
+            # How long the list_tables catalog used for matching is reused
+            "catalog_ttl_seconds": float(os.getenv("TABLE_CATALOG_TTL_SECONDS", "300")),
+            "max_tables": int(os.getenv("SCHEMA_PREFETCH_MAX_TABLES", "3")),
+        }
+
+
+class CheckpointConfig:
+    """Durable per-step checkpoints of workflow runs"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get checkpoint configuration as a dictionary"""
+        return {
+            "enabled": os.getenv("CHECKPOINTS", "true").lower() == "true",
+            "path": Path(os.getenv("CHECKPOINT_DB", Path.cwd() / ".checkpoints.sqlite")),
+            # Older runs are deleted when a new one starts
+            "max_runs": int(os.getenv("CHECKPOINT_MAX_RUNS", "50")),
+        }
+
+
+class LlmCacheConfig:
+    """Opt-in on-disk cache of LLM responses by exact prompt"""
+
+    @staticmethod
+    def get_config() -> dict:
+        """Get LLM cache configuration as a dictionary"""
+        return {
+            # Off by default, a cached response is returned even where sampling would give a different one
+            "enabled": os.getenv("LLM_CACHE", "false").lower() == "true",
+            "path": Path(os.getenv("LLM_CACHE_DB", Path.cwd() / ".llm_cache.sqlite")),
+            "max_bytes": int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        }
@@ -1,31 +1,64 @@
 import asyncio
 import logging
 import sys
-from scripts.workflow import DatabaseWorkflow
-from llama_index.core.workflow import Context
 import argparse
+from config.settings import McpServerConfig
+from scripts.dispatcher import start_mcp_workers, stop_mcp_workers
 
 
 async def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--docker", action="store_true", help="Sets the url to the ollama server (default is docker)")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument("--replay", metavar="RUN_ID", help="Re-run a recorded run, reusing its LLM outputs where the prompts match")
     args = parser.parse_args()
 
-    logging.info(f"Url to ollama server has been set to: {'docker' if args.docker else 'local'}")
-
-    workflow = DatabaseWorkflow()
-    await workflow.initialize(is_docker=args.docker)
-
-
-    while True:
-        try:
-            user_input = input("What would you like to do?")
-            ret = await workflow.run(input=user_input)
-            print(f" final result >>>>>>>> {ret}")
-        except KeyboardInterrupt:
-            print("Exiting...")
-            break
+    # Start the MCP server workers before importing the workflow, their startup overlaps with llama_index's import
+    mcp_workers = start_mcp_workers(McpServerConfig.get_config())
+    try:
+        from scripts.workflow import DatabaseWorkflow
+        from llama_index.core.workflow.errors import WorkflowRuntimeError, WorkflowTimeoutError
+
+        logging.info(f"Url to ollama server has been set to: {'docker' if args.docker else 'local'}")
+
+        workflow = DatabaseWorkflow()
+        await workflow.initialize(is_docker=args.docker, mcp_workers=mcp_workers)
+
+        if args.resume or args.replay:
+            try:
+                ret = await workflow.run(resume_run_id=args.resume, replay_run_id=args.replay)
+                print(f" final result >>>>>>>> {ret}")
+            except WorkflowTimeoutError as e:
+                print(f"Request timed out: {e}")
+                await workflow.cancel_running_queries()
+            except WorkflowRuntimeError as e:
+                # e.g. an unknown run id, or resuming a run that already finished
+                print(f"Could not {'resume' if args.resume else 'replay'} the run: {e}")
+
+
+        while True:
+            try:
+                user_input = input("What would you like to do?")
+                ret = await workflow.run(input=user_input)
+                print(f" final result >>>>>>>> {ret}")
+            except WorkflowTimeoutError as e:
+                print(f"Request timed out: {e}")
+                # The workflow gave up, make sure the database does too
+                await workflow.cancel_running_queries()
+                if workflow.checkpoints:
+                    print(f"Continue it with: python main.py --resume {workflow.current_run_id}")
+            except KeyboardInterrupt:
+                # Session stats, printed once on exit
+                print(f"Query stats: {await workflow.get_query_stats()}")
+                if workflow.llm_cache:
+                    print(f"LLM cache stats: {workflow.llm_cache.stats()}")
+                print(f"Schema prefetch stats: {workflow.prefetch_stats}")
+                print("Exiting...")
+                break
+    finally:
+        # The workers are separate processes, they outlive main() unless stopped
+        stop_mcp_workers(mcp_workers)
 
 if __name__ == "__main__":
     success = asyncio.run(main())
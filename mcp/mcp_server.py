@@ -1,4 +1,23 @@
 import argparse
+import asyncio
+import csv
+import gzip
+import io
+import functools
+import inspect
+import itertools
+import json
+import mmap
+import os
+import re
+import shutil
+import signal
+import threading
+import time
+import uuid
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
 from typing import List, Dict, Any
 import sys
 from pathlib import Path
@@ -6,11 +25,15 @@ from pathlib import Path
 # Add project root to path BEFORE importing config
 sys.path.append(str(Path(__file__).parent.parent))
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+import orjson
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 import psycopg2
 from psycopg2 import Error
+from psycopg2.errors import QueryCanceled
 from typing import  Dict, Optional
-from config.settings import DatabaseConfig
+from config.settings import ChangeFeedConfig, DatabaseConfig, McpServerConfig, QueryGuardConfig, ResultSpillConfig
 
 import logging
 from logging import getLogger
@@ -21,18 +44,59 @@ logger.setLevel(logging.INFO)
 
 mcp = FastMCP("sql-mcp-server")
 
-def establish_connection():
+query_guard_config = QueryGuardConfig.get_config()
+result_spill_config = ResultSpillConfig.get_config()
+change_feed_config = ChangeFeedConfig.get_config()
+
+# Counters for guarded queries, exposed through the get_query_stats tool
+query_stats = {"executed": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+
+# Connections with a guarded query currently running on a worker thread, each with an event
+# that is set once the query was cancelled (through cancel_running_queries or by the request)
+active_connections = {}
+active_connections_lock = threading.Lock()
+
+
+def statement_timeout_for(tool_name: Optional[str]) -> int:
+    """Returns the statement_timeout (ms) for a tool, falling back to the global default."""
+    return query_guard_config["tool_statement_timeouts_ms"].get(
+        tool_name, query_guard_config["statement_timeout_ms"]
+    )
+
+def query_deadline(tool_name: str) -> Optional[float]:
+    """
+    Monotonic time by which a tool's whole read has to finish. Results streamed from a server-side
+    cursor run one statement per FETCH, so statement_timeout alone would only bound each batch.
+    """
+    timeout_ms = statement_timeout_for(tool_name)
+    return time.monotonic() + timeout_ms / 1000 if timeout_ms > 0 else None
+
+def check_interrupted(cursor, deadline: Optional[float]):
+    """
+    Raises QueryCanceled, like an expired statement_timeout or a cancel request, once the deadline
+    has passed or the query was cancelled. conn.cancel() only interrupts a running statement, so
+    loops fetching from a cursor call this between statements.
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        raise QueryCanceled("canceling read due to statement timeout")
+    stop = active_connections.get(cursor.connection)
+    if stop is not None and stop.is_set():
+        raise QueryCanceled("canceling read due to user request")
+
+def establish_connection(tool_name: Optional[str] = None):
     """Connects to the PostgreSQL database and returns the connection object."""
     conn = None
     db_config = DatabaseConfig.get_config()
     try:
-        # Establish the connection
+        # Establish the connection, every statement on it is bounded by the tool's statement_timeout
         conn = psycopg2.connect(
             host=db_config["host"],
             port=db_config["port"],
             database=db_config["database"],
             user=db_config["user"],
-            password=db_config["password"]
+            password=db_config["password"],
+            application_name=f"sql-mcp-server:{tool_name or 'internal'}",
+            options=f"-c statement_timeout={statement_timeout_for(tool_name)}"
         )
         logger.info("Connection to PostgreSQL DB successful!")
         return conn
@@ -48,9 +112,470 @@ def format_results(cursor, results):
     columns = [desc[0] for desc in cursor.description]
     return [dict(zip(columns, row)) for row in results]
 
+# ==================== QUERY GUARDS ====================
+
+class QueryCostExceeded(Exception):
+    """Raised when the planner's cost estimate for a query is above the configured ceiling."""
+
+def estimate_query_cost(cursor, query: str, params=None) -> float:
+    """Returns the planner's total cost estimate for a query without executing it."""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0]
+    return plan[0]["Plan"]["Total Cost"]
+
+async def execute_guarded(conn, cursor, query: str, params=None, then=None):
+    """
+    Executes an agent-generated query on a worker thread so the server stays responsive.
+
+    The query is rejected up front if its EXPLAIN cost is above the ceiling, and the
+    running statement is cancelled server-side if the calling request is cancelled.
+    If given, then(cursor) runs on the same thread after the query (e.g. to fetch from a
+    server-side cursor) and its return value is returned.
+    Raises QueryCostExceeded or psycopg2.Error; callers handle both like any other failure.
+    """
+    max_cost = query_guard_config["max_query_cost"]
+
+    def run():
+        if max_cost > 0:
+            # Separate cursor, server-side (named) cursors can only execute a single statement
+            with conn.cursor() as plan_cursor:
+                cost = estimate_query_cost(plan_cursor, query, params)
+            if cost > max_cost:
+                raise QueryCostExceeded(
+                    f"Estimated query cost {cost:.0f} exceeds the limit of {max_cost:.0f}, narrow the criteria or add a limit"
+                )
+        cursor.execute(query, params)
+        return then(cursor) if then else None
+
+    return await run_guarded(conn, run)
+
+async def run_guarded(conn, work, count: bool = True):
+    """
+    Runs work() (blocking database calls on conn) on a worker thread, cancelling the running
+    statement in Postgres if the calling request is cancelled. With count, the query counters
+    are updated; internal reads such as COPY chunks or change feed polls pass count=False.
+    """
+    stop = threading.Event()
+    with active_connections_lock:
+        active_connections[conn] = stop
+    worker = asyncio.ensure_future(asyncio.to_thread(work))
+    try:
+        result = await asyncio.shield(worker)
+        if count:
+            query_stats["executed"] += 1
+        return result
+    except QueryCostExceeded:
+        if count:
+            query_stats["rejected"] += 1
+        raise
+    except QueryCanceled:
+        # Either statement_timeout expired or cancel_running_queries interrupted the query
+        if count:
+            query_stats["cancelled" if stop.is_set() else "timed_out"] += 1
+        raise
+    except asyncio.CancelledError:
+        # The request went away (client cancelled or disconnected), stop the query in Postgres too
+        stop.set()
+        conn.cancel()
+        # The caller closes the cursor and connection next, they are not thread-safe, so wait
+        # until the worker thread has let go of them
+        await asyncio.wait([worker])
+        if not worker.cancelled():
+            worker.exception()
+        if count:
+            query_stats["cancelled"] += 1
+        logger.info("Cancelled running query after the request was cancelled")
+        raise
+    finally:
+        with active_connections_lock:
+            active_connections.pop(conn, None)
+
+def guard_error_message(e: Exception, action: str) -> str:
+    """Builds the error message for a failed guarded query."""
+    if isinstance(e, QueryCostExceeded):
+        return f"Query rejected: {str(e)}"
+    if isinstance(e, QueryCanceled):
+        return f"Query cancelled while {action}: {str(e)}"
+    return f"Error {action}: {str(e)}"
+
+# ==================== RESULT SPILLING ====================
+# A spilled result is stored as <handle>.csv (header + rows), <handle>.idx (uint64 byte offset of
+# every row followed by the end offset) and <handle>.json (summary). Readers mmap the csv and index
+# files, so paging or aggregating a result never loads it into the Python heap or the LLM context.
+
+NUMERIC_TYPES = (int, float, Decimal)
+
+def fetch_or_spill(cursor, deadline: Optional[float] = None) -> dict:
+    """
+    Fetches query results in batches until the deadline. Returns {"data": rows} while the result is small,
+    or {"result": summary} once its approximate size passes the threshold and it was spilled to disk.
+    """
+    rows = []
+    size = 0
+    while True:
+        check_interrupted(cursor, deadline)
+        batch = cursor.fetchmany(result_spill_config["fetch_batch_size"])
+        if not batch:
+            return {"data": format_results(cursor, rows)}
+        rows.extend(batch)
+        size += sum(len(repr(row)) for row in batch)
+        if size > result_spill_config["threshold_bytes"]:
+            return {"result": spill_results(cursor, rows, deadline)}
+
+def csv_value(value):
+    """Converts a fetched value for the result file, bytea is written the way Postgres prints it."""
+    if isinstance(value, (memoryview, bytes)):
+        return "\\x" + bytes(value).hex()
+    return value
+
+def spill_results(cursor, rows, deadline: Optional[float] = None) -> dict:
+    """Writes the rows fetched so far and the rest of the cursor to a result file, returns its summary."""
+    purge_expired_results()
+    result_spill_config["spill_dir"].mkdir(parents=True, exist_ok=True)
+
+    handle = uuid.uuid4().hex
+    csv_path, idx_path, summary_path = result_paths(handle)
+    columns = [desc[0] for desc in cursor.description]
+    column_stats = [{"null_count": 0, "numeric": True, "min": None, "max": None, "sum": 0.0} for _ in columns]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    position = 0
+    row_count = 0
+
+    try:
+        with open(csv_path, "wb") as data_file, open(idx_path, "wb") as index_file:
+            writer.writerow(columns)
+            position = data_file.write(buffer.getvalue().encode())
+
+            batch = rows
+            while batch:
+                offsets = array("Q")
+                chunks = []
+                for row in batch:
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerow([csv_value(value) for value in row])
+                    encoded = buffer.getvalue().encode()
+                    offsets.append(position)
+                    chunks.append(encoded)
+                    position += len(encoded)
+
+                    for stats, value in zip(column_stats, row):
+                        if value is None:
+                            stats["null_count"] += 1
+                        elif stats["numeric"] and isinstance(value, NUMERIC_TYPES) and not isinstance(value, bool):
+                            value = float(value)
+                            stats["sum"] += value
+                            stats["min"] = value if stats["min"] is None else min(stats["min"], value)
+                            stats["max"] = value if stats["max"] is None else max(stats["max"], value)
+                        else:
+                            stats["numeric"] = False
+
+                data_file.write(b"".join(chunks))
+                offsets.tofile(index_file)
+                row_count += len(batch)
+                check_interrupted(cursor, deadline)
+                batch = cursor.fetchmany(result_spill_config["fetch_batch_size"])
+
+            array("Q", [position]).tofile(index_file)
+    except BaseException:
+        # Timed out, cancelled or failed half way, do not leave a partial result behind
+        delete_result_files(handle)
+        raise
+
+    summary = {
+        "result_handle": handle,
+        "row_count": row_count,
+        "columns": columns,
+        "size_bytes": position,
+        "column_stats": {},
+    }
+    for column, stats in zip(columns, column_stats):
+        summary["column_stats"][column] = {"null_count": stats["null_count"]}
+        non_null = row_count - stats["null_count"]
+        if stats["numeric"] and non_null:
+            summary["column_stats"][column].update(
+                min=stats["min"], max=stats["max"], mean=stats["sum"] / non_null
+            )
+
+    with open(summary_path, "w") as summary_file:
+        json.dump(summary, summary_file)
+
+    logger.info(f"Spilled {row_count} rows ({position} bytes) to result {handle}")
+    summary["preview"] = format_results(cursor, rows[:5])
+    return summary
+
+def result_paths(handle: str):
+    """Returns the csv, index and summary paths for a result handle."""
+    if not re.fullmatch(r"[0-9a-f]{32}", handle):
+        raise ValueError(f"Invalid result handle '{handle}'")
+    base = result_spill_config["spill_dir"] / handle
+    return base.with_suffix(".csv"), base.with_suffix(".idx"), base.with_suffix(".json")
+
+def load_result_summary(handle: str) -> dict:
+    """Loads the summary written when the result was spilled."""
+    _, _, summary_path = result_paths(handle)
+    if not summary_path.exists():
+        raise ValueError(f"Result '{handle}' does not exist or has expired")
+    with open(summary_path) as summary_file:
+        return json.load(summary_file)
+
+def iter_result_rows(handle: str, start: int = 0, stop: Optional[int] = None, chunk_rows: int = 10000):
+    """Yields rows (lists of strings) of a spilled result, decoding chunk_rows at a time from the mapped file."""
+    csv_path, idx_path, _ = result_paths(handle)
+    with open(csv_path, "rb") as data_file, open(idx_path, "rb") as index_file, \
+            mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index, \
+            memoryview(index) as index_view, index_view.cast("Q") as offsets:
+        row_count = len(offsets) - 1
+        stop = row_count if stop is None else min(stop, row_count)
+        for chunk_start in range(max(start, 0), stop, chunk_rows):
+            chunk_stop = min(chunk_start + chunk_rows, stop)
+            text = data[offsets[chunk_start]:offsets[chunk_stop]].decode()
+            yield from csv.reader(io.StringIO(text))
+
+def delete_result_files(handle: str):
+    """Removes every file belonging to a spilled result."""
+    for path in result_paths(handle):
+        path.unlink(missing_ok=True)
+
+def purge_expired_results():
+    """Removes spilled results older than the configured TTL."""
+    spill_dir = result_spill_config["spill_dir"]
+    if not spill_dir.exists():
+        return
+    expires_before = time.time() - result_spill_config["ttl_seconds"]
+    for summary_path in spill_dir.glob("*.json"):
+        if summary_path.stat().st_mtime < expires_before:
+            delete_result_files(summary_path.stem)
+
+def spilled_response(result: dict) -> dict:
+    """Tool response for a result that was too large to return inline."""
+    return {
+        "success": True,
+        "message": (
+            f"Result has {result['row_count']} records, too large to return inline. "
+            f"Use read_result_page, aggregate_result or export_result with result_handle '{result['result_handle']}'"
+        ),
+        "result": result
+    }
+
+# ==================== BULK TRANSFER ====================
+
+# COPY options per export format, Parquet is not a COPY format and is written with pyarrow instead
+EXPORT_FORMATS = {"csv": "FORMAT csv, HEADER true", "binary": "FORMAT binary", "parquet": None}
+COMPRESSIONS = {None: open, "gzip": gzip.open}
+EXPORT_BATCH_ROWS = 50_000
+
+class CountingWriter:
+    """File wrapper that counts the bytes COPY streams through it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.file.write(data)
+
+def parquet_type(pyarrow, type_code: int):
+    """Arrow type for a Postgres column type OID, other types (numeric, json, ...) are written as text."""
+    types = {
+        16: pyarrow.bool_(), 17: pyarrow.binary(), 20: pyarrow.int64(), 21: pyarrow.int16(), 23: pyarrow.int32(),
+        700: pyarrow.float32(), 701: pyarrow.float64(), 1082: pyarrow.date32(),
+        1114: pyarrow.timestamp("us"), 1184: pyarrow.timestamp("us", tz="UTC"),
+    }
+    return types.get(type_code, pyarrow.string())
+
+def parquet_value(value, arrow_type):
+    """Converts a fetched value to what pyarrow expects for the column's Arrow type."""
+    if value is None:
+        return None
+    if isinstance(value, memoryview):
+        return bytes(value)
+    if str(arrow_type) == "string" and not isinstance(value, str):
+        # Decimal keeps its exact text, json/jsonb is written as JSON
+        return json.dumps(value, default=str) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+def write_parquet(pyarrow, parquet, cursor, destination: Path, compression: Optional[str]) -> int:
+    """
+    Streams the rows of an executed (server-side) cursor into a Parquet file, one row group
+    per EXPORT_BATCH_ROWS rows, and returns the number of rows written.
+    """
+    batch = cursor.fetchmany(EXPORT_BATCH_ROWS)
+    schema = pyarrow.schema([(desc.name, parquet_type(pyarrow, desc.type_code)) for desc in cursor.description])
+    # Only text and binary columns need their values converted, the rest pyarrow takes as fetched
+    converted_types = {pyarrow.string(), pyarrow.binary()}
+    rows = 0
+    with parquet.ParquetWriter(destination, schema, compression=compression or "snappy") as writer:
+        while batch:
+            writer.write_table(pyarrow.Table.from_arrays(
+                [
+                    pyarrow.array(
+                        [parquet_value(row[i], field.type) for row in batch] if field.type in converted_types
+                        else [row[i] for row in batch],
+                        type=field.type,
+                    )
+                    for i, field in enumerate(schema)
+                ],
+                schema=schema,
+            ))
+            rows += len(batch)
+            check_interrupted(cursor, None)
+            batch = cursor.fetchmany(EXPORT_BATCH_ROWS)
+    return rows
+
+IMPORT_FORMATS = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl", "parquet": "parquet"}
+IMPORT_CHUNK_ROWS = 50_000
+
+def detect_import_format(path: Path) -> Optional[str]:
+    """Infers csv/jsonl/parquet from the file extension, ignoring a trailing .gz"""
+    suffixes = [suffix.lstrip(".") for suffix in path.suffixes if suffix != ".gz"]
+    return IMPORT_FORMATS.get(suffixes[-1].lower()) if suffixes else None
+
+def jsonl_row(record: dict, columns: List[str]) -> list:
+    """Aligns a JSONL record to the columns of the first record."""
+    if not isinstance(record, dict):
+        raise ValueError(f"Line is not a JSON object: {str(record)[:100]}")
+    unknown = set(record) - set(columns)
+    if unknown:
+        raise ValueError(f"Record has keys {sorted(unknown)} that are not in the first record")
+    return [record.get(column) for column in columns]
+
+def read_import_file(path: Path, file_format: str, chunk_rows: int):
+    """
+    Opens a CSV, JSONL or Parquet file (csv/jsonl may be gzip compressed) for import.
+    Returns its column names, a generator of row batches of at most chunk_rows rows,
+    and the total row count when the format knows it up front (otherwise None).
+    """
+    if file_format == "parquet":
+        import pyarrow.parquet as parquet  # optional dependency, only needed for Parquet imports
+
+        parquet_file = parquet.ParquetFile(path)
+        batches = (
+            list(zip(*(column.to_pylist() for column in batch.columns)))
+            for batch in parquet_file.iter_batches(batch_size=chunk_rows)
+        )
+        return parquet_file.schema_arrow.names, batches, parquet_file.metadata.num_rows
+
+    file = gzip.open(path, "rt", newline="") if path.suffix == ".gz" else open(path, newline="")
+    if file_format == "csv":
+        reader = csv.reader(file)
+        columns = next(reader, [])
+        rows = ([value if value != "" else None for value in row] for row in reader)
+    else:
+        records = (json.loads(line) for line in file if line.strip())
+        first = next(records, None)
+        columns = list(first) if isinstance(first, dict) else []
+        rows = (jsonl_row(record, columns) for record in itertools.chain([first] if first else [], records))
+
+    def batches():
+        with file:
+            while batch := list(itertools.islice(rows, chunk_rows)):
+                yield batch
+
+    return columns, batches(), None
+
+def parses_as(values, parse) -> bool:
+    """True if parse() accepts every value."""
+    try:
+        for value in values:
+            parse(value)
+        return True
+    except ValueError:
+        return False
+
+def infer_column_type(values) -> str:
+    """Infers a Postgres column type from sample values of a file column."""
+    values = [value for value in values if value is not None]
+    if not values:
+        return "text"
+    if all(isinstance(value, bool) for value in values):
+        return "boolean"
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return "bigint"
+    if all(isinstance(value, Decimal) for value in values):
+        return "numeric"
+    if all(isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) for value in values):
+        return "double precision"
+    if all(isinstance(value, datetime) for value in values):
+        return "timestamp"
+    if all(isinstance(value, date) for value in values):
+        return "date"
+    if all(isinstance(value, (dict, list)) for value in values):
+        return "jsonb"
+    if not all(isinstance(value, str) for value in values):
+        return "text"
+
+    # CSV values are always strings, try the narrowest type that parses all of them
+    if parses_as(values, int):
+        return "bigint"
+    if parses_as(values, float):
+        return "double precision"
+    if all(value.lower() in ("true", "false") for value in values):
+        return "boolean"
+    if parses_as(values, date.fromisoformat):
+        return "date"
+    if parses_as(values, datetime.fromisoformat):
+        return "timestamp"
+    return "text"
+
+def copy_value(value):
+    """Converts a file value for COPY ... FROM STDIN WITH (FORMAT csv)"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return csv_value(value)
+
+def transfer_stats(rows: int, bytes_transferred: int, elapsed: float) -> dict:
+    """Throughput figures reported by the bulk transfer tools."""
+    elapsed = max(elapsed, 1e-9)
+    return {
+        "rows": rows,
+        "bytes": bytes_transferred,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed),
+        "mb_per_sec": round(bytes_transferred / elapsed / 1_000_000, 2),
+    }
+
+# ==================== RESULT ENCODING ====================
+# Tool results are encoded to JSON exactly once here, with native handling of the types psycopg2
+# returns, and handed to FastMCP as text so it does not serialize them again.
+
+def encode_default(value):
+    """Encodes the Postgres types orjson does not handle natively."""
+    if isinstance(value, (memoryview, bytes)):
+        return csv_value(value)
+    # Decimal as a string like FastMCP's default encoder so no precision is lost,
+    # intervals, ranges, inet and other types as their text representation
+    return str(value)
+
+def encode_result(result) -> str:
+    """JSON-encodes a tool result (datetime, date, UUID natively, Decimal and bytea via encode_default)."""
+    return orjson.dumps(result, default=encode_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def tool(description: str):
+    """
+    Registers fn as an MCP tool whose result is pre-encoded with encode_result.
+    fn itself is returned unchanged, so tools can still call each other and get dicts back.
+    """
+    def register(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def encoded(*args, **kwargs):
+                return encode_result(await fn(*args, **kwargs))
+        else:
+            @functools.wraps(fn)
+            def encoded(*args, **kwargs):
+                return encode_result(fn(*args, **kwargs))
+        mcp.tool(description=description)(encoded)
+        return fn
+    return register
+
 # ==================== CREATE OPERATIONS ====================
 
-@mcp.tool(description="creates a new table in the database with custom schema")
+@tool(description="creates a new table in the database with custom schema")
 def create_table(table_name: str, schema: str):
     """
     Args:
@@ -59,7 +584,7 @@ def create_table(table_name: str, schema: str):
     Returns:
         dict: Status message with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("create_table")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -81,7 +606,7 @@ def create_table(table_name: str, schema: str):
         cursor.close()
         conn.close()
 
-@mcp.tool(description="inserts single/multiple records into a specified table")
+@tool(description="inserts single/multiple records into a specified table")
 def insert_record(table_name: str, data: List[Dict[str, Any]]):
     """
     Args:
@@ -91,7 +616,7 @@ def insert_record(table_name: str, data: List[Dict[str, Any]]):
     Returns:
         dict: Status message with success/failure information and inserted record ID
     """
-    conn = establish_connection()
+    conn = establish_connection("insert_record")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -130,8 +655,8 @@ def insert_record(table_name: str, data: List[Dict[str, Any]]):
 
 # ==================== READ OPERATIONS ====================
 
-@mcp.tool(description="retrieves all records from a table")
-def get_all_records(table_name: str, limit: Optional[int] = 100):
+@tool(description="retrieves all records from a table")
+async def get_all_records(table_name: str, limit: Optional[int] = 100):
     """
     Args:
         table_name (str): Name of the table to query
@@ -140,17 +665,22 @@ def get_all_records(table_name: str, limit: Optional[int] = 100):
     Returns:
         dict: Query results with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("get_all_records")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
-    cursor = conn.cursor()
+    # Server-side cursor, rows are streamed in batches and spilled to disk if the result is large
+    cursor = conn.cursor(name=f"read_{uuid.uuid4().hex}")
     try:
         query = f"SELECT * FROM {table_name} LIMIT %s"
-        cursor.execute(query, (limit,))
-        results = cursor.fetchall()
+        result = await execute_guarded(
+            conn, cursor, query, (limit,),
+            then=functools.partial(fetch_or_spill, deadline=query_deadline("get_all_records"))
+        )
+        if "result" in result:
+            return spilled_response(result["result"])
         
-        formatted_results = format_results(cursor, results)
+        formatted_results = result["data"]
         
         return {
             "success": True,
@@ -158,14 +688,14 @@ def get_all_records(table_name: str, limit: Optional[int] = 100):
             "data": formatted_results
         }
         
-    except Error as e:
-        return {"success": False, "message": f"Error retrieving records: {str(e)}"}
+    except (Error, QueryCostExceeded) as e:
+        return {"success": False, "message": guard_error_message(e, "retrieving records")}
     finally:
         cursor.close()
         conn.close()
 
-@mcp.tool(description="finds records by specific criteria")
-def get_all_records_by_criterion(table_name: str, where_clause: str):
+@tool(description="finds records by specific criteria")
+async def get_all_records_by_criterion(table_name: str, where_clause: str):
     """
     Args:
         table_name (str): Name of the table to query
@@ -174,19 +704,24 @@ def get_all_records_by_criterion(table_name: str, where_clause: str):
     Returns:
         dict: Query results with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("get_all_records_by_criterion")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
-    cursor = conn.cursor()
+    # Server-side cursor, rows are streamed in batches and spilled to disk if the result is large
+    cursor = conn.cursor(name=f"read_{uuid.uuid4().hex}")
     try:        
         
         query = f"SELECT * FROM {table_name} WHERE {where_clause}"
         
-        cursor.execute(query)
-        results = cursor.fetchall()
+        result = await execute_guarded(
+            conn, cursor, query,
+            then=functools.partial(fetch_or_spill, deadline=query_deadline("get_all_records_by_criterion"))
+        )
+        if "result" in result:
+            return spilled_response(result["result"])
         
-        formatted_results = format_results(cursor, results)
+        formatted_results = result["data"]
         
         return {
             "success": True,
@@ -194,13 +729,13 @@ def get_all_records_by_criterion(table_name: str, where_clause: str):
             "data": formatted_results
         }
         
-    except Error as e:
-        return {"success": False, "message": f"Error finding records: {str(e)}"}
+    except (Error, QueryCostExceeded) as e:
+        return {"success": False, "message": guard_error_message(e, "finding records")}
     finally:
         cursor.close()
         conn.close()
 
-@mcp.tool(description="gets a single record by ID")
+@tool(description="gets a single record by ID")
 def get_record_by_id(table_name: str, record_id: int):
     """
     Args:
@@ -210,7 +745,7 @@ def get_record_by_id(table_name: str, record_id: int):
     Returns:
         dict: Record data with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("get_record_by_id")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -241,8 +776,8 @@ def get_record_by_id(table_name: str, record_id: int):
 
 # ==================== UPDATE OPERATIONS ====================
 
-@mcp.tool(description="updates a single record by ID")
-def update_record(table_name: str, record_ids: int, set_condition: str):
+@tool(description="updates a single record by ID")
+async def update_record(table_name: str, record_ids: int, set_condition: str):
     """
     Args:
         table_name (str): Name of the table to update
@@ -257,7 +792,7 @@ def update_record(table_name: str, record_ids: int, set_condition: str):
     Returns:
         dict: Status message with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("update_record")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -272,7 +807,7 @@ def update_record(table_name: str, record_ids: int, set_condition: str):
         RETURNING id;
         """
         
-        cursor.execute(update_query)
+        await execute_guarded(conn, cursor, update_query)
         updated_record = cursor.fetchall()
         
         if updated_record:
@@ -288,17 +823,17 @@ def update_record(table_name: str, record_ids: int, set_condition: str):
                 "message": f"No records found with ID {record_ids}"
             }
         
-    except Error as e:
+    except (Error, QueryCostExceeded) as e:
         conn.rollback()
-        return {"success": False, "message": f"Error updating record: {str(e)}"}
+        return {"success": False, "message": guard_error_message(e, "updating record")}
     finally:
         cursor.close()
         conn.close()
 
 
 
-@mcp.tool(description="updates multiple records by criteria")
-def update_records_by_criteria(table_name: str, set_clause: str, where_clause: str):
+@tool(description="updates multiple records by criteria")
+async def update_records_by_criteria(table_name: str, set_clause: str, where_clause: str):
     """
     Args:
         table_name (str): Name of the table to update
@@ -313,7 +848,7 @@ def update_records_by_criteria(table_name: str, set_clause: str, where_clause: s
     Returns:
         dict: Status message with success/failure information and count of updated records
     """
-    conn = establish_connection()
+    conn = establish_connection("update_records_by_criteria")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -327,7 +862,7 @@ def update_records_by_criteria(table_name: str, set_clause: str, where_clause: s
         RETURNING id;
         """
         
-        cursor.execute(update_query)
+        await execute_guarded(conn, cursor, update_query)
         updated_records = cursor.fetchall()
         
         if updated_records:
@@ -344,16 +879,16 @@ def update_records_by_criteria(table_name: str, set_clause: str, where_clause: s
                 "message": "No records found matching the criteria"
             }
         
-    except Error as e:
+    except (Error, QueryCostExceeded) as e:
         conn.rollback()
-        return {"success": False, "message": f"Error updating records: {str(e)}"}
+        return {"success": False, "message": guard_error_message(e, "updating records")}
     finally:
         cursor.close()
         conn.close()
 
 # ==================== DELETE OPERATIONS ====================
 
-@mcp.tool(description="deletes a single record by ID")
+@tool(description="deletes a single record by ID")
 def delete_record(table_name: str, record_id: int):
     """
     Args:
@@ -363,7 +898,7 @@ def delete_record(table_name: str, record_id: int):
     Returns:
         dict: Status message with success/failure information
     """
-    conn = establish_connection()
+    conn = establish_connection("delete_record")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -398,8 +933,8 @@ def delete_record(table_name: str, record_id: int):
         cursor.close()
         conn.close()
 
-@mcp.tool(description="deletes multiple records by criteria")
-def delete_records_by_criteria(table_name: str, where_clause: str):
+@tool(description="deletes multiple records by criteria")
+async def delete_records_by_criteria(table_name: str, where_clause: str):
     """
     Args:
         table_name (str): Name of the table to delete from
@@ -409,7 +944,7 @@ def delete_records_by_criteria(table_name: str, where_clause: str):
     Returns:
         dict: Status message with success/failure information and count of deleted records
     """
-    conn = establish_connection()
+    conn = establish_connection("delete_records_by_criteria")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -422,7 +957,7 @@ def delete_records_by_criteria(table_name: str, where_clause: str):
         RETURNING id;
         """
         
-        cursor.execute(delete_query)
+        await execute_guarded(conn, cursor, delete_query)
         deleted_records = cursor.fetchall()
         
         conn.commit()
@@ -433,16 +968,256 @@ def delete_records_by_criteria(table_name: str, where_clause: str):
             "deleted_count": len(deleted_records)
         }
         
+    except (Error, QueryCostExceeded) as e:
+        conn.rollback()
+        return {"success": False, "message": guard_error_message(e, "deleting records")}
+    finally:
+        cursor.close()
+        conn.close()
+
+# ==================== BULK OPERATIONS ====================
+
+@tool(description="exports a table (optionally filtered) to a local CSV, binary or Parquet file, for large dumps")
+async def export_table(
+    table_name: str,
+    destination_path: str,
+    file_format: str = "csv",
+    compression: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    where_clause: Optional[str] = None,
+):
+    """
+    Args:
+        table_name (str): Name of the table to export
+        destination_path (str): Local path of the file to write
+        file_format (str): "csv" (with header), "binary" (Postgres COPY binary format, row by row) or
+            "parquet" (columnar) (default: csv)
+        compression (str, optional): "gzip" to compress the file, uncompressed if omitted (Parquet uses snappy then)
+        columns (List[str], optional): Columns to export, all columns if omitted
+        where_clause (str, optional): sql like where clause to filter the exported rows e.g. "age > 25"
+
+    Returns:
+        dict: Status message with success/failure information and throughput
+    """
+    if file_format not in EXPORT_FORMATS:
+        return {"success": False, "message": f"Unknown format '{file_format}', use one of {list(EXPORT_FORMATS)}"}
+    if compression not in COMPRESSIONS:
+        return {"success": False, "message": f"Unknown compression '{compression}', use gzip or omit it"}
+    if file_format == "parquet":
+        try:
+            import pyarrow  # optional dependency, only needed for Parquet exports
+            import pyarrow.parquet as parquet
+        except ImportError:
+            return {"success": False, "message": "Exporting Parquet files requires pyarrow to be installed"}
+
+    conn = establish_connection("export_table")
+    if not conn:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    # Parquet is written from a server-side cursor, rows are fetched in batches
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}") if file_format == "parquet" else conn.cursor()
+    destination = Path(destination_path)
+    # Written next to the destination and moved over it once complete, an existing file is only
+    # replaced by a finished export
+    partial = destination.with_name(f".{destination.name}.partial")
+    try:
+        select_query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+        if where_clause:
+            select_query += f" WHERE {where_clause}"
+        copy_query = f"COPY ({select_query}) TO STDOUT WITH ({EXPORT_FORMATS[file_format]})"
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+
+        def copy_out():
+            # COPY streams the rows through the file chunk by chunk, memory use does not grow with the table
+            with COMPRESSIONS[compression](partial, "wb") as file:
+                writer = CountingWriter(file)
+                cursor.copy_expert(copy_query, writer)
+            return cursor.rowcount, writer.bytes_written
+
+        def parquet_out():
+            cursor.execute(select_query)
+            rows = write_parquet(pyarrow, parquet, cursor, partial, compression)
+            return rows, partial.stat().st_size
+
+        started = time.perf_counter()
+        try:
+            rows, bytes_written = await run_guarded(conn, parquet_out if file_format == "parquet" else copy_out)
+            os.replace(partial, destination)
+        except BaseException:
+            # Failed, timed out or cancelled half way, do not leave a partial file behind
+            partial.unlink(missing_ok=True)
+            raise
+        stats = transfer_stats(rows, bytes_written, time.perf_counter() - started)
+        logger.info(f"Exported {table_name} to {destination}: {stats}")
+
+        return {
+            "success": True,
+            "message": f"Exported {stats['rows']} records from '{table_name}' to '{destination}'",
+            "throughput": stats
+        }
+
+    except (Error, OSError, ValueError, TypeError) as e:
+        # pyarrow raises ValueError/TypeError subclasses for values it cannot convert
+        return {"success": False, "message": guard_error_message(e, "exporting table")}
+    finally:
+        cursor.close()
+        conn.close()
+
+def import_target_columns(table_name: str) -> Optional[dict]:
+    """
+    Columns of the table an import loads into, mapped to whether the file has to supply them.
+    Identity and generated columns are filled in by Postgres although information_schema reports
+    no default for them. None if no connection could be established.
+    """
+    conn = establish_connection("import_file")
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT column_name,
+                       is_nullable = 'NO' AND column_default IS NULL AND is_identity = 'NO' AND is_generated = 'NEVER'
+                FROM information_schema.columns
+                WHERE table_name = %s AND table_schema = 'public'
+                ORDER BY ordinal_position
+                """,
+                (table_name,)
+            )
+            return dict(cursor.fetchall())
+    finally:
+        conn.close()
+
+@tool(description="imports a local CSV, JSONL or Parquet file into a table using COPY, for large loads")
+async def import_file(
+    file_path: str,
+    table_name: str,
+    file_format: Optional[str] = None,
+    create_if_missing: bool = False,
+    chunk_rows: int = IMPORT_CHUNK_ROWS,
+    ctx: Context = None,
+):
+    """
+    Args:
+        file_path (str): Local path of the file to import (csv/jsonl may be .gz compressed)
+        table_name (str): Name of the table to load into
+        file_format (str, optional): "csv" (with header), "jsonl" or "parquet", inferred from the extension if omitted
+        create_if_missing (bool): Create the table with column types inferred from the file if it does not exist
+        chunk_rows (int): Rows sent per COPY chunk (default: 50000)
+
+    Returns:
+        dict: Status message with success/failure information and throughput
+    """
+    path = Path(file_path)
+    file_format = file_format or detect_import_format(path)
+    if file_format not in IMPORT_FORMATS.values():
+        return {"success": False, "message": f"Unknown format for '{file_path}', use one of csv, jsonl, parquet"}
+    if chunk_rows < 1:
+        return {"success": False, "message": "chunk_rows must be at least 1"}
+
+    try:
+        columns, batches, total_rows = await asyncio.to_thread(read_import_file, path, file_format, chunk_rows)
+        # The first chunk doubles as the sample for schema inference
+        first_batch = await asyncio.to_thread(next, batches, [])
+    except ImportError:
+        return {"success": False, "message": "Importing Parquet files requires pyarrow to be installed"}
+    except (OSError, ValueError, csv.Error) as e:
+        return {"success": False, "message": f"Error reading file: {str(e)}"}
+    if not columns:
+        return {"success": False, "message": f"File '{file_path}' has no columns"}
+
+    try:
+        table_columns = await asyncio.to_thread(import_target_columns, table_name)
     except Error as e:
+        return {"success": False, "message": f"Error getting schema: {str(e)}"}
+    if table_columns is None:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    create_query = None
+    if not table_columns:
+        if not create_if_missing:
+            return {"success": False, "message": f"Table '{table_name}' does not exist, set create_if_missing to create it"}
+        column_types = {
+            column: infer_column_type([row[position] for row in first_batch])
+            for position, column in enumerate(columns)
+        }
+        create_query = (
+            f"CREATE TABLE IF NOT EXISTS {table_name} "
+            f"({', '.join(f'{column} {column_type}' for column, column_type in column_types.items())})"
+        )
+    else:
+        unknown = [column for column in columns if column not in table_columns]
+        if unknown:
+            return {"success": False, "message": f"Columns {unknown} do not exist in '{table_name}'"}
+        missing = [name for name, required in table_columns.items() if required and name not in columns]
+        if missing:
+            return {"success": False, "message": f"File is missing required columns {missing} of '{table_name}'"}
+
+    conn = establish_connection("import_file")
+    if not conn:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    cursor = conn.cursor()
+    try:
+        if create_query:
+            # Created in the import's transaction, a failed import does not leave an empty table behind
+            await run_guarded(conn, lambda: cursor.execute(create_query), count=False)
+            logger.info(f"Creating {table_name} with inferred columns {column_types}")
+
+        copy_query = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        chunks = itertools.chain([first_batch] if first_batch else [], batches)
+
+        def copy_next_chunk():
+            # Reading, encoding and copying one bounded chunk at a time keeps memory flat
+            batch = next(chunks, None)
+            if batch is None:
+                return 0, 0
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([copy_value(value) for value in row] for row in batch)
+            size = buffer.tell()
+            buffer.seek(0)
+            cursor.copy_expert(copy_query, buffer)
+            return len(batch), size
+
+        rows = 0
+        bytes_copied = 0
+        started = time.perf_counter()
+        while True:
+            copied, size = await run_guarded(conn, copy_next_chunk, count=False)
+            if not copied:
+                break
+            rows += copied
+            bytes_copied += size
+            logger.info(f"Imported {rows}{f'/{total_rows}' if total_rows else ''} rows into {table_name} "
+                        f"({rows / (time.perf_counter() - started):.0f} rows/s)")
+            if ctx:
+                try:
+                    await ctx.report_progress(rows, total_rows)
+                except ValueError:
+                    # Called directly rather than through an MCP request, nobody to report to
+                    ctx = None
+
+        # A single transaction, a failed chunk leaves the table untouched (or not created at all)
+        conn.commit()
+        stats = transfer_stats(rows, bytes_copied, time.perf_counter() - started)
+
+        return {
+            "success": True,
+            "message": f"Imported {rows} records from '{file_path}' into '{table_name}'",
+            "throughput": stats
+        }
+
+    except (Error, OSError, ValueError, csv.Error) as e:
         conn.rollback()
-        return {"success": False, "message": f"Error deleting records: {str(e)}"}
+        return {"success": False, "message": guard_error_message(e, "importing file")}
     finally:
         cursor.close()
         conn.close()
 
 # ==================== UTILITY OPERATIONS ====================
 
-@mcp.tool(description="gets table schema information")
+@tool(description="gets table schema information")
 def get_table_schema(table_name: str):
     """
     Args:
@@ -451,7 +1226,7 @@ def get_table_schema(table_name: str):
     Returns:
         dict: Table schema information
     """
-    conn = establish_connection()
+    conn = establish_connection("get_table_schema")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -488,13 +1263,13 @@ def get_table_schema(table_name: str):
         cursor.close()
         conn.close()
 
-@mcp.tool(description="lists all tables in the database")
+@tool(description="lists all tables in the database")
 def list_tables():
     """
     Returns:
         dict: List of all tables in the database
     """
-    conn = establish_connection()
+    conn = establish_connection("list_tables")
     if not conn:
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -523,13 +1298,13 @@ def list_tables():
         cursor.close()
         conn.close()
 
-@mcp.tool(description="drops a table from the database")
+@tool(description="drops a table from the database")
 def drop_table(table_name: str):
     """
     Args:
         table_name (str): Name of the table to drop
     """
-    conn = establish_connection()
+    conn = establish_connection("drop_table")
     if not conn:    
         return {"success": False, "message": "Failed to establish database connection"}
     
@@ -556,10 +1331,492 @@ def drop_table(table_name: str):
 
 
 
+# ==================== CHANGE FEED OPERATIONS ====================
+# Watched tables get a row trigger that logs every change to mcp_change_feed.changes and sends a
+# NOTIFY, so get_changes reads only what changed since a cursor instead of re-reading the table.
+
+CHANGE_FEED_CHANNEL = "mcp_change_feed"
+
+CHANGE_FEED_SETUP = """
+CREATE SCHEMA IF NOT EXISTS mcp_change_feed;
+CREATE TABLE IF NOT EXISTS mcp_change_feed.changes (
+    id bigserial PRIMARY KEY,
+    txid bigint NOT NULL DEFAULT txid_current(),
+    table_name text NOT NULL,
+    operation text NOT NULL,
+    row_data jsonb NOT NULL,
+    old_row_data jsonb,
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS changes_position ON mcp_change_feed.changes (table_name, txid, id);
+CREATE INDEX IF NOT EXISTS changes_changed_at ON mcp_change_feed.changes (changed_at);
+CREATE OR REPLACE FUNCTION mcp_change_feed.record_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO mcp_change_feed.changes (table_name, operation, row_data)
+        VALUES (TG_TABLE_NAME, TG_OP, to_jsonb(OLD));
+    ELSE
+        INSERT INTO mcp_change_feed.changes (table_name, operation, row_data, old_row_data)
+        VALUES (TG_TABLE_NAME, TG_OP, to_jsonb(NEW), CASE WHEN TG_OP = 'UPDATE' THEN to_jsonb(OLD) END);
+    END IF;
+    -- Sent on commit, identical notifications of one transaction are folded into one
+    PERFORM pg_notify('mcp_change_feed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+def parse_change_cursor(change_cursor: Optional[str]) -> tuple:
+    """
+    Parses a "txid:id" cursor, the position of the last change read. Changes are ordered by
+    (txid, id): ids are assigned before commit, so on their own a later read could still find a
+    smaller id committed after a bigger one, but a transaction's txid is settled once it is
+    older than every running transaction.
+    """
+    if not change_cursor:
+        return 0, 0
+    txid, change_id = change_cursor.split(":")
+    return int(txid), int(change_id)
+
+def change_horizon(cursor) -> int:
+    """
+    Oldest transaction still running. Every transaction before it has finished, so all of their
+    changes are visible to the next statement and none can show up later behind a cursor.
+    """
+    cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+    return cursor.fetchone()[0]
+
+def is_change_feed_enabled(cursor, table_name: str) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = 'mcp_change_feed')",
+        (table_name,)
+    )
+    return cursor.fetchone()[0]
+
+def read_changes(cursor, table_name: str, position: tuple, limit: int) -> tuple:
+    """
+    Returns up to limit changes to a table after position, the cursor to continue from, whether
+    more changes are waiting and how many committed changes are held back. Only changes below the
+    horizon are returned, later ones wait until every older transaction has finished.
+    """
+    horizon = change_horizon(cursor)
+    cursor.execute(
+        """
+        SELECT txid, id, operation, row_data, old_row_data, changed_at
+        FROM mcp_change_feed.changes
+        WHERE table_name = %s AND (txid, id) > (%s, %s) AND txid < %s
+        ORDER BY txid, id
+        LIMIT %s
+        """,
+        (table_name, *position, horizon, limit + 1),
+    )
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    cursor.execute(
+        "SELECT count(*) FROM mcp_change_feed.changes WHERE table_name = %s AND (txid, id) > (%s, %s) AND txid >= %s",
+        (table_name, *position, horizon),
+    )
+    held_back = cursor.fetchone()[0]
+
+    changes = []
+    for _, change_id, operation, row, old_row, changed_at in rows:
+        change = {"id": change_id, "operation": operation, "row": row, "changed_at": changed_at}
+        if old_row is not None:
+            # Only the previous values of the columns the update changed
+            change["old_values"] = {column: value for column, value in old_row.items() if row.get(column) != value}
+        changes.append(change)
+
+    if has_more:
+        next_cursor = f"{rows[-1][0]}:{rows[-1][1]}"
+    else:
+        # Caught up with every finished transaction, continue after all of them
+        next_cursor = f"{horizon}:0"
+    return changes, next_cursor, has_more, held_back
+
+def oldest_running_transaction(cursor) -> Optional[dict]:
+    """The running transaction that holds the change horizon back, None if it is not visible to this role."""
+    cursor.execute(
+        """
+        SELECT pid, usename, state, extract(epoch FROM now() - xact_start), left(query, 200)
+        FROM pg_stat_activity
+        WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid()
+        ORDER BY age(backend_xid) DESC
+        LIMIT 1
+        """
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    pid, user, state, age, query = row
+    return {"pid": pid, "user": user, "state": state, "age_seconds": round(float(age), 1), "query": query}
+
+async def wait_for_notification(conn, table_name: str, timeout: float) -> bool:
+    """Waits until a NOTIFY for the table arrives on a connection that LISTENs, or the timeout passes."""
+    loop = asyncio.get_running_loop()
+    notified = asyncio.Event()
+
+    def check_notifies():
+        if any(notify.payload == table_name for notify in conn.notifies):
+            notified.set()
+        conn.notifies.clear()
+
+    def on_readable():
+        conn.poll()
+        check_notifies()
+
+    # Notifications that arrived while the changes were read are already queued
+    check_notifies()
+    loop.add_reader(conn.fileno(), on_readable)
+    try:
+        await asyncio.wait_for(notified.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(conn.fileno())
+
+@tool(description="starts logging inserts, updates and deletes on a table so get_changes can return only what changed")
+def enable_change_feed(table_name: str):
+    """
+    Args:
+        table_name (str): Name of the table to watch
+    Returns:
+        dict: Status message and the cursor to pass to the first get_changes call
+    """
+    conn = establish_connection("enable_change_feed")
+    if not conn:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CHANGE_FEED_SETUP)
+        cursor.execute(f"DROP TRIGGER IF EXISTS mcp_change_feed ON {table_name}")
+        cursor.execute(f"""
+        CREATE TRIGGER mcp_change_feed
+        AFTER INSERT OR UPDATE OR DELETE ON {table_name}
+        FOR EACH ROW EXECUTE FUNCTION mcp_change_feed.record_change()
+        """)
+        conn.commit()
+
+        # Changes from here on, earlier ones were never logged
+        change_cursor = f"{change_horizon(cursor)}:0"
+        conn.commit()
+
+        return {
+            "success": True,
+            "message": f"Watching '{table_name}' for changes, pass the cursor to get_changes",
+            "cursor": change_cursor
+        }
+
+    except Error as e:
+        conn.rollback()
+        return {"success": False, "message": f"Error enabling change feed: {str(e)}"}
+    finally:
+        cursor.close()
+        conn.close()
+
+@tool(description="returns the rows inserted, updated or deleted in a watched table since a cursor, optionally waiting for new changes")
+async def get_changes(table_name: str, cursor: Optional[str] = None, wait_seconds: float = 0, limit: Optional[int] = None):
+    """
+    Args:
+        table_name (str): Name of a table watched with enable_change_feed
+        cursor (str, optional): Cursor returned by enable_change_feed or the previous get_changes call,
+            all logged changes if omitted
+        wait_seconds (float, optional): If there are no changes yet, wait up to this long for one
+        limit (int, optional): Maximum number of changes to return
+    Returns:
+        dict: The changes, the cursor for the next call and whether more changes are waiting, plus
+            held_back when committed changes wait behind an older running transaction
+    """
+    try:
+        position = parse_change_cursor(cursor)
+    except ValueError:
+        return {"success": False, "message": f"Invalid cursor '{cursor}', use one returned by enable_change_feed or get_changes"}
+    limit = min(limit or change_feed_config["max_changes"], change_feed_config["max_changes"])
+    wait_seconds = min(max(wait_seconds, 0), change_feed_config["max_wait_seconds"])
+
+    conn = establish_connection("get_changes")
+    if not conn:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    # Notifications are only delivered outside of transactions
+    conn.autocommit = True
+    db_cursor = conn.cursor()
+    try:
+        if not is_change_feed_enabled(db_cursor, table_name):
+            return {"success": False, "message": f"'{table_name}' is not watched, call enable_change_feed first"}
+
+        db_cursor.execute(
+            "DELETE FROM mcp_change_feed.changes WHERE changed_at < now() - make_interval(secs => %s)",
+            (change_feed_config["retention_seconds"],)
+        )
+        if wait_seconds:
+            # Listen before reading, a change committed in between is then not missed
+            db_cursor.execute(f"LISTEN {CHANGE_FEED_CHANNEL}")
+
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            changes, next_cursor, has_more, held_back = await run_guarded(
+                conn, lambda: read_changes(db_cursor, table_name, position, limit), count=False
+            )
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0 or not await wait_for_notification(conn, table_name, remaining):
+                break
+            # A NOTIFY also arrives for changes still behind an older running transaction, read again until
+            # they are visible or the wait is over
+            position = parse_change_cursor(next_cursor)
+
+        result = {
+            "success": True,
+            "message": f"{len(changes)} changes to '{table_name}'{', more are waiting' if has_more else ''}",
+            "changes": changes,
+            "cursor": next_cursor,
+            "has_more": has_more
+        }
+        if held_back:
+            # Committed changes exist but an older transaction is still open, they are returned once it ends
+            oldest = await run_guarded(conn, lambda: oldest_running_transaction(db_cursor), count=False)
+            holder = (
+                f"a transaction open for {oldest['age_seconds']}s (pid {oldest['pid']})" if oldest
+                else "an older running transaction"
+            )
+            result["message"] += f", {held_back} committed changes held back by {holder}"
+            result["held_back"] = {"changes": held_back, "oldest_transaction": oldest}
+        return result
+
+    except Error as e:
+        return {"success": False, "message": guard_error_message(e, "reading changes")}
+    finally:
+        db_cursor.close()
+        conn.close()
+
+@tool(description="stops logging changes on a table and deletes its logged changes")
+def disable_change_feed(table_name: str):
+    """
+    Args:
+        table_name (str): Name of the watched table
+    """
+    conn = establish_connection("disable_change_feed")
+    if not conn:
+        return {"success": False, "message": "Failed to establish database connection"}
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TRIGGER IF EXISTS mcp_change_feed ON {table_name}")
+        cursor.execute("SELECT to_regclass('mcp_change_feed.changes') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            cursor.execute("DELETE FROM mcp_change_feed.changes WHERE table_name = %s", (table_name,))
+        conn.commit()
+
+        return {"success": True, "message": f"Stopped watching '{table_name}' for changes"}
+
+    except Error as e:
+        conn.rollback()
+        return {"success": False, "message": f"Error disabling change feed: {str(e)}"}
+    finally:
+        cursor.close()
+        conn.close()
+
+# ==================== RESULT HANDLE OPERATIONS ====================
+
+@tool(description="reads a page of rows (optionally only some columns) from a large result handle")
+def read_result_page(result_handle: str, offset: int = 0, limit: int = 50, columns: Optional[List[str]] = None):
+    """
+    Args:
+        result_handle (str): Handle returned by a read tool whose result was too large
+        offset (int): Index of the first row to return (default: 0)
+        limit (int): Number of rows to return, capped by the server (default: 50)
+        columns (List[str], optional): Columns to return, all columns if omitted
+
+    Returns:
+        dict: Rows as dictionaries of strings (NULL is returned as an empty string)
+    """
+    try:
+        summary = load_result_summary(result_handle)
+        all_columns = summary["columns"]
+        selected = columns or all_columns
+        missing = [column for column in selected if column not in all_columns]
+        if missing:
+            return {"success": False, "message": f"Unknown columns {missing}, available: {all_columns}"}
+
+        positions = [all_columns.index(column) for column in selected]
+        limit = min(limit, result_spill_config["max_page_rows"])
+        rows = [
+            {column: row[position] for column, position in zip(selected, positions)}
+            for row in iter_result_rows(result_handle, offset, offset + limit)
+        ]
+
+        return {
+            "success": True,
+            "message": f"Rows {offset} to {offset + len(rows)} of {summary['row_count']}",
+            "data": rows
+        }
+
+    except (OSError, ValueError) as e:
+        return {"success": False, "message": f"Error reading result: {str(e)}"}
+
+@tool(description="computes count, sum, avg, min, max or distinct_count of a column of a large result handle")
+def aggregate_result(result_handle: str, column: str, operation: str):
+    """
+    Args:
+        result_handle (str): Handle returned by a read tool whose result was too large
+        column (str): Column to aggregate
+        operation (str): One of count, sum, avg, min, max, distinct_count
+
+    Returns:
+        dict: Aggregate value with success/failure information
+    """
+    operations = ("count", "sum", "avg", "min", "max", "distinct_count")
+    if operation not in operations:
+        return {"success": False, "message": f"Unknown operation '{operation}', use one of {list(operations)}"}
+
+    try:
+        summary = load_result_summary(result_handle)
+        if column not in summary["columns"]:
+            return {"success": False, "message": f"Unknown column '{column}', available: {summary['columns']}"}
+        position = summary["columns"].index(column)
+
+        count = 0
+        total = 0.0
+        minimum = maximum = None
+        distinct = set()
+        for row in iter_result_rows(result_handle):
+            value = row[position]
+            if value == "":
+                continue
+            count += 1
+            if operation == "distinct_count":
+                distinct.add(value)
+            elif operation != "count":
+                number = float(value)
+                total += number
+                minimum = number if minimum is None else min(minimum, number)
+                maximum = number if maximum is None else max(maximum, number)
+
+        values = {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else None,
+            "min": minimum,
+            "max": maximum,
+            "distinct_count": len(distinct),
+        }
+        return {
+            "success": True,
+            "message": f"{operation}({column}) over {summary['row_count']} records",
+            "value": values[operation]
+        }
+
+    except (OSError, ValueError) as e:
+        return {"success": False, "message": f"Error aggregating result: {str(e)}"}
+
+@tool(description="copies a large result handle to a local CSV file")
+def export_result(result_handle: str, destination_path: str):
+    """
+    Args:
+        result_handle (str): Handle returned by a read tool whose result was too large
+        destination_path (str): Local path of the CSV file to write
+
+    Returns:
+        dict: Status message with success/failure information
+    """
+    try:
+        summary = load_result_summary(result_handle)
+        csv_path, _, _ = result_paths(result_handle)
+        shutil.copyfile(csv_path, destination_path)
+        return {
+            "success": True,
+            "message": f"Exported {summary['row_count']} records to '{destination_path}'"
+        }
+
+    except (OSError, ValueError) as e:
+        return {"success": False, "message": f"Error exporting result: {str(e)}"}
+
+@tool(description="deletes a large result handle once it is no longer needed")
+def drop_result(result_handle: str):
+    """
+    Args:
+        result_handle (str): Handle returned by a read tool whose result was too large
+
+    Returns:
+        dict: Status message with success/failure information
+    """
+    try:
+        delete_result_files(result_handle)
+        return {"success": True, "message": f"Result '{result_handle}' dropped"}
+
+    except (OSError, ValueError) as e:
+        return {"success": False, "message": f"Error dropping result: {str(e)}"}
+
+# ==================== QUERY GUARD OPERATIONS ====================
+# Used by the workflow itself and hidden from the LLM
+
+@tool(description="cancels every guarded query that is currently running")
+def cancel_running_queries():
+    """
+    Returns:
+        dict: Number of running queries a cancel request was sent for
+    """
+    with active_connections_lock:
+        running = list(active_connections.items())
+
+    for conn, stop in running:
+        # psycopg2 sends the cancel request to the backend, the blocked execute() then raises QueryCanceled,
+        # a fetch loop between statements sees the event instead
+        stop.set()
+        conn.cancel()
+
+    logger.info(f"Sent cancel request for {len(running)} running queries")
+    return {
+        "success": True,
+        "message": f"Cancelled {len(running)} running queries",
+        "cancelled_count": len(running)
+    }
+
+@tool(description="gets counters for executed, rejected, timed out and cancelled queries")
+def get_query_stats():
+    """
+    Returns:
+        dict: Query guard counters since the server started
+    """
+    return {
+        "success": True,
+        "message": "Query guard statistics",
+        "stats": dict(query_stats)
+    }
+
+# ==================== HEALTH CHECK ====================
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """Liveness endpoint polled by the workflow's dispatcher"""
+    with active_connections_lock:
+        running = len(active_connections)
+    return JSONResponse({"status": "ok", "pid": os.getpid(), "running_queries": running})
+
+
+def run_workers(args):
+    """Launches one server process per worker on consecutive ports and waits for them"""
+    # Same launcher main.py uses, so both stop their workers the same way
+    from scripts.dispatcher import start_mcp_workers, stop_mcp_workers
+
+    workers = start_mcp_workers({"host": args.mcp_host, "base_port": args.mcp_port, "workers": args.workers})
+    logger.info(f"Started {args.workers} MCP server workers on ports {args.mcp_port}-{args.mcp_port + args.workers - 1}")
+    # SIGTERM would otherwise end this process without running the finally block, orphaning the workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.wait()
+    finally:
+        stop_mcp_workers(workers)
+
 def main():
     """Main function with command line argument support"""
-    # Get default database configuration
+    # Get default database and server configuration
     db_config = DatabaseConfig.get_config()
+    server_config = McpServerConfig.get_config()
     
     parser = argparse.ArgumentParser(description="MCP SQL Server with configurable database connection")
     parser.add_argument("--host", default=db_config["host"], help="Database host")
@@ -567,12 +1824,28 @@ def main():
     parser.add_argument("--database", default=db_config["database"], help="Database name")
     parser.add_argument("--user", default=db_config["user"], help="Database user")
     parser.add_argument("--password", default=db_config["password"], help="Database password")
-    parser.add_argument("--mcp-host", default="127.0.0.1", help="MCP server host (default: 127.0.0.1)")
-    parser.add_argument("--mcp-port", type=int, default=8000, help="MCP server port (default: 8000)")
+    parser.add_argument("--mcp-host", default=server_config["host"], help="MCP server host (default: 127.0.0.1)")
+    parser.add_argument("--mcp-port", type=int, default=server_config["base_port"], help="MCP server port, first worker's port with --workers (default: 8000)")
+    parser.add_argument("--workers", type=int, default=server_config["workers"], help="Number of server processes, on consecutive ports (default: 1)")
     
     args = parser.parse_args()
 
+    # Connections are opened per tool call from the environment, which workers also inherit
+    os.environ.update({
+        "DB_HOST": args.host,
+        "DB_PORT": str(args.port),
+        "DB_NAME": args.database,
+        "DB_USER": args.user,
+        "DB_PASSWORD": args.password,
+    })
+
+    if args.workers > 1:
+        run_workers(args)
+        return
+
     # Start the MCP server
+    mcp.settings.host = args.mcp_host
+    mcp.settings.port = args.mcp_port
     mcp.run(transport="sse")
 
     # schema = get_table_schema(table_name='customers')
@@ -0,0 +1,419 @@
+"""
+Benchmarks for the MCP database tools, run against the database from config/settings.py.
+
+    python scripts/benchmark.py export --rows 2000000
+    python scripts/benchmark.py llm
+    python scripts/benchmark.py workers --workers 1 2 4
+    python scripts/benchmark.py encode --rows 5000 --columns 40
+    python scripts/benchmark.py cache --repeat 5
+    python scripts/benchmark.py startup --top 10
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# What each entry point imports before it can serve: main.py up to the first prompt, the server up to mcp.run
+STARTUP_IMPORTS = {
+    "main.py": "import main, scripts.workflow",
+    "mcp_server.py": (
+        "import importlib.util; "
+        "spec = importlib.util.spec_from_file_location('mcp_server', 'mcp/mcp_server.py'); "
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+    ),
+}
+
+
+def load_mcp_server():
+    """Imports mcp/mcp_server.py as a module (the mcp/ folder shadows the mcp package name)"""
+    path = Path(__file__).parent.parent / "mcp" / "mcp_server.py"
+    spec = importlib.util.spec_from_file_location("mcp_server", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(fn):
+    """Runs fn and returns (result, seconds, peak Python heap in MB)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1_000_000
+
+
+def seed_table(server, table_name: str, rows: int):
+    """(Re)creates a benchmark table with the requested number of rows using generate_series"""
+    conn = server.establish_connection("create_table")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET statement_timeout = 0")
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+        if cursor.fetchone()[0]:
+            cursor.execute(f"SELECT count(*) FROM {table_name}")
+            if cursor.fetchone()[0] == rows:
+                return
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cursor.execute(f"""
+        CREATE TABLE {table_name} AS
+        SELECT i AS id,
+               'customer_' || i AS name,
+               'customer_' || i || '@example.com' AS email,
+               (random() * 1000)::numeric(10, 2) AS amount,
+               now() - (i || ' seconds')::interval AS created_at
+        FROM generate_series(1, %s) AS i
+        """, (rows,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def benchmark_export(args):
+    server = load_mcp_server()
+    print(f"Seeding {args.table} with {args.rows} rows...")
+    seed_table(server, args.table, args.rows)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for file_format, compression in (("csv", None), ("csv", "gzip"), ("binary", None), ("parquet", None)):
+            destination = Path(out_dir) / f"{args.table}.{file_format}{'.gz' if compression else ''}"
+            result, elapsed, peak_mb = measure(lambda: asyncio.run(server.export_table(
+                args.table, str(destination), file_format=file_format, compression=compression
+            )))
+            if not result["success"]:
+                print(f"export_table {file_format}/{compression}: {result['message']}")
+                continue
+            stats = result["throughput"]
+            print(
+                f"export_table {file_format:<6} {compression or 'none':<5} "
+                f"{stats['rows_per_sec']:>10} rows/s {stats['mb_per_sec']:>8} MB/s "
+                f"{elapsed:7.2f}s peak heap {peak_mb:8.1f} MB"
+            )
+
+        if args.skip_baseline:
+            return
+
+        # What dumping a table looked like before: get_all_records with a big limit, fetchall + JSON encode
+        def fetch_and_encode():
+            conn = server.establish_connection("get_all_records")
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT * FROM {args.table} LIMIT %s", (args.rows,))
+                rows = server.format_results(cursor, cursor.fetchall())
+                with open(Path(out_dir) / f"{args.table}.json", "w") as file:
+                    json.dump(rows, file, default=str)
+                return len(rows)
+            finally:
+                cursor.close()
+                conn.close()
+
+        rows, elapsed, peak_mb = measure(fetch_and_encode)
+        print(
+            f"fetchall + json         {round(rows / elapsed):>10} rows/s "
+            f"{'':>13} {elapsed:7.2f}s peak heap {peak_mb:8.1f} MB"
+        )
+
+
+async def first_token_latency(client, config: dict, keep_alive) -> float:
+    """Seconds until the first streamed token of a one-token chat request"""
+    started = time.perf_counter()
+    first_token = None
+    stream = await client.chat(
+        model=config["model"],
+        messages=[{"role": "user", "content": "ping"}],
+        # Same options as the workflow's requests, Ollama reloads the model when num_ctx changes
+        options={
+            "temperature": config["temperature"],
+            "num_ctx": config["context_window"],
+            **config["additional_kwargs"],
+            "num_predict": 1,
+        },
+        keep_alive=keep_alive,
+        stream=True,
+    )
+    async for _ in stream:
+        first_token = first_token or time.perf_counter() - started
+    return first_token
+
+
+async def benchmark_llm_async(args):
+    from ollama import AsyncClient
+    from config.settings import OllamaConfig
+
+    config = OllamaConfig.get_config(args.docker)
+    client = AsyncClient(host=config["base_url"])
+    keep_alive = config["keep_alive"]
+
+    # Unload the model so the first request pays the full load time
+    await client.generate(model=config["model"], keep_alive=0)
+    cold = await first_token_latency(client, config, keep_alive)
+    warm = [await first_token_latency(client, config, keep_alive) for _ in range(args.repeat)]
+    # Same requests with a new HTTP client (and connection) each time, as without client reuse
+    fresh = [await first_token_latency(AsyncClient(host=config["base_url"]), config, keep_alive) for _ in range(args.repeat)]
+
+    print(f"model {config['model']} keep_alive={keep_alive} options={config['additional_kwargs']}")
+    print(f"cold first token                 {cold * 1000:8.1f} ms")
+    print(f"warm first token, reused client  {statistics.median(warm) * 1000:8.1f} ms (median of {args.repeat})")
+    print(f"warm first token, new client     {statistics.median(fresh) * 1000:8.1f} ms (median of {args.repeat})")
+
+
+def benchmark_llm(args):
+    asyncio.run(benchmark_llm_async(args))
+
+
+async def benchmark_workers_async(args):
+    from scripts.dispatcher import McpDispatcher
+
+    tool_arguments = json.loads(args.arguments)
+    server_path = Path(__file__).parent.parent / "mcp" / "mcp_server.py"
+
+    for workers in args.workers:
+        server = subprocess.Popen([
+            sys.executable, str(server_path),
+            "--mcp-port", str(args.port), "--workers", str(workers),
+        ])
+        try:
+            dispatcher = McpDispatcher([f"http://127.0.0.1:{args.port + worker}" for worker in range(workers)])
+            await dispatcher.wait_until_healthy(timeout=30)
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def call():
+                async with semaphore:
+                    await dispatcher.call_tool(args.tool, tool_arguments)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(args.calls)))
+            elapsed = time.perf_counter() - started
+
+            spread = [stats["calls"] for stats in dispatcher.stats().values()]
+            print(f"{workers} worker(s): {args.calls / elapsed:8.1f} calls/s ({elapsed:.2f}s), calls per worker {spread}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def benchmark_workers(args):
+    asyncio.run(benchmark_workers_async(args))
+
+
+def wide_rows(rows: int, columns: int) -> list[dict]:
+    """Synthetic result rows cycling through the types psycopg2 returns"""
+    import datetime
+    import uuid
+    from decimal import Decimal
+
+    makers = [
+        lambda i: i,
+        lambda i: Decimal(i) / 7,
+        lambda i: datetime.datetime(2024, 1, 1) + datetime.timedelta(seconds=i),
+        lambda i: uuid.UUID(int=i),
+        lambda i: memoryview(i.to_bytes(8, "little")),
+        lambda i: f"customer_{i}@example.com",
+        lambda i: None,
+    ]
+    return [{f"col_{c}": makers[c % len(makers)](r) for c in range(columns)} for r in range(rows)]
+
+
+def benchmark_encode(args):
+    import pydantic_core
+    from mcp.types import CallToolResult, TextContent
+    from scripts.workflow import tool_result_text
+
+    server = load_mcp_server()
+    result = {"success": True, "message": f"Retrieved {args.rows} records", "data": wide_rows(args.rows, args.columns)}
+
+    def previous_path():
+        # FastMCP's default conversion of a dict result, then str() of the CallToolResult in handle_tool_calls
+        text = pydantic_core.to_json(result, fallback=str, indent=2).decode()
+        return str(CallToolResult(content=[TextContent(type="text", text=text)]))
+
+    def encoded_path():
+        # encode_result on the server, the text passed through unchanged by the workflow
+        text = server.encode_result(result)
+        return tool_result_text(CallToolResult(content=[TextContent(type="text", text=text)]))
+
+    for name, path in (("previous (pydantic + str)", previous_path), ("encode_result (orjson)", encoded_path)):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            observation = path()
+            timings.append(time.perf_counter() - started)
+        print(f"{name:<26} {statistics.median(timings) * 1000:9.1f} ms  {len(observation) / 1_000_000:7.2f} MB observation")
+
+
+async def benchmark_cache_async(args):
+    import os
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # The workflow reads these when it is created, an empty cache makes the first run the uncached baseline
+        os.environ.update({
+            "LLM_CACHE": "true",
+            "LLM_CACHE_DB": str(Path(cache_dir) / "llm_cache.sqlite"),
+            "CHECKPOINTS": "false",
+        })
+        from scripts.workflow import DatabaseWorkflow
+
+        workflow = DatabaseWorkflow()
+        await workflow.initialize(is_docker=args.docker)
+        cache = workflow.llm_cache
+        try:
+            durations = []
+            for run in range(args.repeat):
+                # Each repetition is a new session, as when a scripted task is run again
+                workflow.memory.reset()
+                hits, misses = cache.hits, cache.misses
+                started = time.perf_counter()
+                await workflow.run(input=args.request)
+                durations.append(time.perf_counter() - started)
+                print(f"run {run + 1}  {durations[-1]:8.2f} s  "
+                      f"{cache.hits - hits} LLM calls from cache, {cache.misses - misses} from Ollama")
+        finally:
+            workflow.stop_mcp_workers()
+
+        print(f"model {workflow.llm.model}, {args.repeat} runs of {args.request!r}")
+        print(f"first run (empty cache)  {durations[0]:8.2f} s")
+        if len(durations) > 1:
+            print(f"repeated runs            {statistics.median(durations[1:]):8.2f} s (median)")
+        print(f"cache stats              {cache.stats()}")
+
+
+def benchmark_cache(args):
+    asyncio.run(benchmark_cache_async(args))
+
+
+def import_breakdown(code: str) -> list[tuple[str, float]]:
+    """
+    Runs code in a fresh interpreter under -X importtime and returns the import time in seconds
+    spent in each top-level package (the self time of all its modules), slowest first
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_time) / 1_000_000
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def startup_time(code: str) -> float:
+    """Seconds a fresh interpreter takes to run code, without the -X importtime overhead"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+async def server_ready_time(port: int, timeout: float = 30) -> float:
+    """Seconds from launching a server worker until its /health endpoint answers"""
+    import httpx
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "mcp" / "mcp_server.py"), "--mcp-port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient(timeout=1) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if (await client.get(f"http://127.0.0.1:{port}/health")).status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.02)
+        raise RuntimeError(f"MCP server did not answer /health within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def benchmark_startup(args):
+    budgets = {"main.py": args.main_budget_ms, "mcp_server.py": args.server_budget_ms}
+    over_budget = []
+    for entry_point, code in STARTUP_IMPORTS.items():
+        elapsed = min(startup_time(code) for _ in range(args.repeat))
+        print(f"{entry_point}: imports {elapsed * 1000:.0f} ms (best of {args.repeat}), budget {budgets[entry_point]} ms")
+        for package, seconds in import_breakdown(code)[:args.top]:
+            print(f"    {seconds * 1000:8.1f} ms  {package}")
+
+        if entry_point == "mcp_server.py":
+            # The import plus starting uvicorn, until the worker can take calls
+            elapsed = min(asyncio.run(server_ready_time(args.port)) for _ in range(args.repeat))
+            print(f"    {elapsed * 1000:8.1f} ms  until /health answers")
+        if elapsed * 1000 > budgets[entry_point]:
+            over_budget.append(entry_point)
+
+    if over_budget:
+        print(f"Over the startup budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the MCP database tools")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export_table (COPY TO) throughput and memory")
+    export_parser.add_argument("--rows", type=int, default=2_000_000, help="Rows in the benchmark table")
+    export_parser.add_argument("--table", default="bench_export", help="Benchmark table name")
+    export_parser.add_argument("--skip-baseline", action="store_true", help="Skip the fetchall + JSON comparison")
+    export_parser.set_defaults(run=benchmark_export)
+
+    llm_parser = subparsers.add_parser("llm", help="Ollama cold vs warm first-token latency")
+    llm_parser.add_argument("--docker", action="store_true", help="Use the docker Ollama url")
+    llm_parser.add_argument("--repeat", type=int, default=5, help="Warm requests to take the median of")
+    llm_parser.set_defaults(run=benchmark_llm)
+
+    workers_parser = subparsers.add_parser("workers", help="Tool call throughput with N MCP server workers")
+    workers_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    workers_parser.add_argument("--calls", type=int, default=500, help="Tool calls per run")
+    workers_parser.add_argument("--concurrency", type=int, default=32, help="Concurrent tool calls")
+    workers_parser.add_argument("--tool", default="get_all_records", help="Tool to call")
+    workers_parser.add_argument("--arguments", default='{"table_name": "bench_export", "limit": 500}', help="Tool arguments as JSON")
+    workers_parser.add_argument("--port", type=int, default=8100, help="First worker port, kept apart from a running server")
+    workers_parser.set_defaults(run=benchmark_workers)
+
+    encode_parser = subparsers.add_parser("encode", help="Tool result encoding, previous path vs encode_result")
+    encode_parser.add_argument("--rows", type=int, default=5000, help="Rows in the result")
+    encode_parser.add_argument("--columns", type=int, default=40, help="Columns per row")
+    encode_parser.add_argument("--repeat", type=int, default=5, help="Runs to take the median of")
+    encode_parser.set_defaults(run=benchmark_encode)
+
+    cache_parser = subparsers.add_parser("cache", help="Workflow runs of a repeated task with the LLM response cache")
+    cache_parser.add_argument("--docker", action="store_true", help="Use the docker Ollama url")
+    cache_parser.add_argument("--repeat", type=int, default=5, help="Times to run the task")
+    cache_parser.add_argument("--request", default="Show me 5 records from the customers table", help="User request to run")
+    cache_parser.set_defaults(run=benchmark_cache)
+
+    startup_parser = subparsers.add_parser("startup", help="Import-time breakdown and startup time of main.py and the MCP server")
+    startup_parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    startup_parser.add_argument("--repeat", type=int, default=3, help="Runs to take the best of")
+    startup_parser.add_argument("--main-budget-ms", type=int, default=2500, help="Budget for main.py's imports")
+    startup_parser.add_argument("--server-budget-ms", type=int, default=1500, help="Budget until a server worker is healthy")
+    startup_parser.add_argument("--port", type=int, default=8100, help="Port for the measured server, kept apart from a running server")
+    startup_parser.set_defaults(run=benchmark_startup)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from llama_index.core.agent.react.types import (
+    ActionReasoningStep,
+    ObservationReasoningStep,
+    ResponseReasoningStep,
+)
+from llama_index.core.llms import ChatMessage
+
+STEP_TYPES = {cls.__name__: cls for cls in (ActionReasoningStep, ObservationReasoningStep, ResponseReasoningStep)}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    user_input TEXT NOT NULL,
+    replay_of TEXT,
+    start_messages TEXT NOT NULL DEFAULT '[]',
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    step_name TEXT NOT NULL,
+    steps TEXT NOT NULL,
+    messages TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoints_run ON checkpoints(run_id, seq);
+CREATE TABLE IF NOT EXISTS llm_outputs (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    call_index INTEGER NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (run_id, call_index)
+);
+"""
+
+
+def serialize_steps(steps: list) -> str:
+    """Reasoning steps as JSON, tagged with their type so they can be rebuilt"""
+    return json.dumps([{"type": type(step).__name__, "data": step.model_dump(mode="json")} for step in steps])
+
+
+def deserialize_steps(data: str) -> list:
+    return [STEP_TYPES[step["type"]].model_validate(step["data"]) for step in json.loads(data)]
+
+
+def serialize_messages(messages: list[ChatMessage]) -> str:
+    return json.dumps([message.model_dump(mode="json") for message in messages])
+
+
+def deserialize_messages(data: str) -> list[ChatMessage]:
+    return [ChatMessage.model_validate(message) for message in json.loads(data)]
+
+
+def prompt_hash(messages: list[ChatMessage]) -> str:
+    """Content hash of a formatted LLM prompt"""
+    return hashlib.sha256(serialize_messages(messages).encode()).hexdigest()
+
+
+class CheckpointStore:
+    """SQLite store of per-step workflow checkpoints and the LLM outputs each run received"""
+
+    def __init__(self, path: Path, max_runs: int) -> None:
+        self.max_runs = max_runs
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        # Stores created before runs recorded their starting memory
+        if "start_messages" not in {row["name"] for row in self.conn.execute("PRAGMA table_info(runs)")}:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN start_messages TEXT NOT NULL DEFAULT '[]'")
+
+    def start_run(self, run_id: str, user_input: str, start_messages: list[ChatMessage], replay_of: Optional[str] = None) -> None:
+        """Records a new run with the conversation memory it started from"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (run_id, user_input, replay_of, start_messages, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                (run_id, user_input, replay_of, serialize_messages(start_messages), now, now),
+            )
+        self.prune()
+
+    def finish_run(self, run_id: str, status: str) -> None:
+        with self.conn:
+            self.conn.execute("UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, time.time(), run_id))
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        row = self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def start_messages(self, run_id: str) -> list[ChatMessage]:
+        """Conversation memory of earlier requests the run started with"""
+        row = self.conn.execute("SELECT start_messages FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return deserialize_messages(row["start_messages"]) if row else []
+
+    def save(self, run_id: str, step_name: str, steps: list, messages: list[ChatMessage], state: dict) -> None:
+        """Checkpoints the reasoning steps, conversation memory and extra run state after a workflow step"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO checkpoints (run_id, step_name, steps, messages, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, step_name, serialize_steps(steps), serialize_messages(messages), json.dumps(state), now),
+            )
+            self.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+
+    def load_latest(self, run_id: str) -> Optional[dict]:
+        """The last checkpoint of a run, with steps and messages rebuilt"""
+        row = self.conn.execute(
+            "SELECT * FROM checkpoints WHERE run_id = ? ORDER BY seq DESC LIMIT 1", (run_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "step_name": row["step_name"],
+            "steps": deserialize_steps(row["steps"]),
+            "messages": deserialize_messages(row["messages"]),
+            "state": json.loads(row["state"]),
+        }
+
+    def record_llm_output(self, run_id: str, call_index: int, prompt_digest: str, message: ChatMessage) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_outputs (run_id, call_index, prompt_hash, message) VALUES (?, ?, ?, ?)",
+                (run_id, call_index, prompt_digest, json.dumps(message.model_dump(mode="json"))),
+            )
+
+    def recorded_llm_output(self, run_id: str, call_index: int) -> Optional[tuple[str, ChatMessage]]:
+        """(prompt hash, message) the run's call_index-th LLM call returned, if recorded"""
+        row = self.conn.execute(
+            "SELECT prompt_hash, message FROM llm_outputs WHERE run_id = ? AND call_index = ?", (run_id, call_index)
+        ).fetchone()
+        return (row["prompt_hash"], ChatMessage.model_validate(json.loads(row["message"]))) if row else None
+
+    def prune(self) -> None:
+        """Keeps only the most recent max_runs runs"""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM runs WHERE run_id NOT IN (SELECT run_id FROM runs ORDER BY created_at DESC LIMIT ?)",
+                (self.max_runs,),
+            )
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def start_mcp_workers(server_config: dict) -> list[subprocess.Popen]:
+    """Starts one MCP server process per worker on consecutive ports, without a supervisor process in between"""
+    server_path = Path(__file__).parent.parent / "mcp" / "mcp_server.py"
+    return [
+        subprocess.Popen([
+            sys.executable, str(server_path),
+            "--mcp-host", server_config["host"],
+            "--mcp-port", str(server_config["base_port"] + worker),
+            "--workers", "1",
+        ])
+        for worker in range(server_config["workers"])
+    ]
+
+
+def stop_mcp_workers(workers: list[subprocess.Popen], timeout: float = 5.0) -> None:
+    """Terminates the MCP server processes, killing any that do not exit within the timeout"""
+    for process in workers:
+        if process.poll() is None:
+            process.terminate()
+    for process in workers:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Whether a failed call could not reach its worker, MCP clients raise these wrapped in exception groups"""
+    if isinstance(error, BaseExceptionGroup):
+        return any(is_connection_error(inner) for inner in error.exceptions)
+    return isinstance(error, (httpx.HTTPError, OSError))
+
+
+class McpDispatcher:
+    """Spreads MCP tool calls over several server workers, picking the one with the fewest outstanding calls"""
+
+    def __init__(self, urls: list[str]) -> None:
+        from llama_index.tools.mcp import BasicMCPClient
+
+        self.urls = urls
+        self.clients = [BasicMCPClient(f"{url}/sse") for url in urls]
+        self.outstanding = [0] * len(urls)
+        self.calls = [0] * len(urls)
+        self.healthy = [True] * len(urls)
+
+    def pick_worker(self) -> int:
+        """Healthy worker with the fewest outstanding calls, ties go to the one that served fewer calls"""
+        candidates = [worker for worker, healthy in enumerate(self.healthy) if healthy] or range(len(self.urls))
+        return min(candidates, key=lambda worker: (self.outstanding[worker], self.calls[worker]))
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        """Calls a tool on the least busy worker"""
+        worker = self.pick_worker()
+        self.outstanding[worker] += 1
+        self.calls[worker] += 1
+        try:
+            return await self.clients[worker].call_tool(tool_name, arguments)
+        except Exception as e:
+            if is_connection_error(e):
+                # Not retried elsewhere, the tool may already have written to the database
+                self.healthy[worker] = False
+                logger.warning(f"⚠️ MCP worker {self.urls[worker]} failed, marked unhealthy")
+            raise
+        finally:
+            self.outstanding[worker] -= 1
+
+    async def broadcast(self, tool_name: str, arguments: dict) -> list:
+        """Calls a tool on every worker, e.g. to cancel queries wherever they run"""
+        return await asyncio.gather(
+            *(client.call_tool(tool_name, arguments) for client in self.clients),
+            return_exceptions=True,
+        )
+
+    async def check_health(self, timeout: float = 2.0) -> list[bool]:
+        """Polls every worker's /health endpoint and updates which ones receive calls"""
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            responses = await asyncio.gather(
+                *(client.get(f"{url}/health") for url in self.urls),
+                return_exceptions=True,
+            )
+        healthy = [not isinstance(response, Exception) and response.status_code == 200 for response in responses]
+        for url, was_healthy, is_healthy in zip(self.urls, self.healthy, healthy):
+            if was_healthy != is_healthy:
+                logger.info(f"{'✅' if is_healthy else '⚠️'} MCP worker {url} is {'healthy' if is_healthy else 'unhealthy'}")
+        self.healthy = healthy
+        return healthy
+
+    async def wait_until_healthy(self, timeout: float) -> None:
+        """Waits for every worker to answer its health check"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not all(await self.check_health()):
+            if asyncio.get_running_loop().time() > deadline:
+                down = [url for url, healthy in zip(self.urls, self.healthy) if not healthy]
+                raise RuntimeError(f"MCP workers did not start within {timeout}s: {down}")
+            await asyncio.sleep(0.2)
+
+    async def monitor_health(self, interval: float) -> None:
+        """Re-checks worker health until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health()
+
+    def stats(self) -> dict:
+        """Calls served and currently outstanding per worker"""
+        return {
+            url: {"calls": calls, "outstanding": outstanding, "healthy": healthy}
+            for url, calls, outstanding, healthy in zip(self.urls, self.calls, self.outstanding, self.healthy)
+        }
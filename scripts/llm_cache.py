@@ -0,0 +1,88 @@
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from llama_index.core.llms import ChatMessage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used);
+"""
+
+
+def cache_key(prompt_digest: str, model: str, params: dict) -> str:
+    """Content address of an LLM call: the prompt hash, the model and every parameter that changes its output"""
+    return hashlib.sha256(json.dumps([prompt_digest, model, params], sort_keys=True).encode()).hexdigest()
+
+
+class LlmCache:
+    """SQLite cache of LLM responses by exact prompt, evicting the least recently used ones past max_bytes"""
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[ChatMessage]:
+        row = self.conn.execute("SELECT message FROM responses WHERE cache_key = ?", (key,)).fetchone()
+        if not row:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.conn:
+            self.conn.execute(
+                "UPDATE responses SET hits = hits + 1, last_used = ? WHERE cache_key = ?", (time.time(), key)
+            )
+        return ChatMessage.model_validate(json.loads(row[0]))
+
+    def put(self, key: str, message: ChatMessage) -> None:
+        data = json.dumps(message.model_dump(mode="json"))
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, message, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes the least recently used responses until the cache fits in max_bytes"""
+        total = self.conn.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        keys = []
+        for key, size in self.conn.execute("SELECT cache_key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            keys.append((key,))
+            total -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM responses WHERE cache_key = ?", keys)
+        self.evictions += len(keys)
+
+    def stats(self) -> dict:
+        """Hit rate of this session and the size of the cache on disk"""
+        entries, size = self.conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
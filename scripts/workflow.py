@@ -1,21 +1,22 @@
 import asyncio
-from re import S
+import json
+import re
 import sys
-import subprocess
+import time
+import uuid
 from pathlib import Path
-from turtle import st
+from typing import Optional
 
 # Add project root to path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from llama_index.core.llms import ChatMessage,ChatResponse
-from llama_index.llms.ollama import Ollama
-from llama_index.tools.mcp import BasicMCPClient, McpToolSpec
+import httpx
 
 
 
 from llama_index.core.agent.react import ReActChatFormatter, ReActOutputParser
-from llama_index.core.agent.react.types import ActionReasoningStep, ObservationReasoningStep
+from llama_index.core.agent.react.types import ActionReasoningStep, ObservationReasoningStep, ResponseReasoningStep
 
 from llama_index.core.workflow import StartEvent,StopEvent,Workflow,step
 from llama_index.core.memory import Memory
@@ -23,7 +24,10 @@ from llama_index.core.workflow import Context
 
 
 from config.prompts import SYSTEM_PROMPT
-from config.settings import OllamaConfig
+from config.settings import CheckpointConfig, LlmCacheConfig, McpServerConfig, OllamaConfig, SchemaPrefetchConfig
+from .checkpoints import CheckpointStore, prompt_hash
+from .dispatcher import McpDispatcher, start_mcp_workers, stop_mcp_workers
+from .llm_cache import LlmCache, cache_key
 from .events import * 
 
 
@@ -31,6 +35,39 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Server tools the workflow calls itself, never offered to the LLM
+INTERNAL_TOOLS = {"cancel_running_queries", "get_query_stats"}
+
+# Tools after which the cached table catalog is stale
+CATALOG_CHANGING_TOOLS = {"create_table", "drop_table", "import_file"}
+
+
+
+def tool_result_text(result) -> str:
+    """The JSON the server already encoded for a tool result, passed through without re-serializing"""
+    text = "".join(content.text for content in result.content if content.type == "text")
+    return f"Error: {text}" if result.isError else text
+
+
+def mentioned_tables(user_input: str, tables) -> list[str]:
+    """Tables named in the user input, also matching singular names and underscores written as spaces"""
+    text = user_input.lower()
+    found = []
+    for table in sorted(tables):
+        forms = {table.lower(), table.lower().replace("_", " ")}
+        forms |= {form[:-1] for form in forms if form.endswith("s") and len(form) > 3}
+        if any(re.search(rf"\b{re.escape(form)}\b", text) for form in forms):
+            found.append(table)
+    return found
+
+
+def tool_call_event(step: ActionReasoningStep) -> ToolCallEvent:
+    """Tool call requested by a ReAct action step"""
+    return ToolCallEvent(tool_calls=[ToolSelection(
+                                    tool_id="Tool_ID",
+                                    tool_name=step.action, 
+                                    tool_kwargs=step.action_input)
+                                    ])
 
 
 class DatabaseWorkflow(Workflow):
@@ -38,53 +75,264 @@ class DatabaseWorkflow(Workflow):
         super().__init__(timeout=120.0)
         self.agent = None
         self.llm = None
-        self.mcp_client = None
+        self.dispatcher = None
+        self.mcp_workers = None
+        self.health_monitor = None
         self.tools = None
         self.ollama_config = None
         self.memory = Memory.from_defaults()
+        self.prefetch_config = SchemaPrefetchConfig.get_config()
+        self.table_catalog = None
+        self.table_catalog_loaded_at = 0.0
+        self.prefetch_stats = {"requests": 0, "prefetched_requests": 0, "schemas_prefetched": 0, "redundant_schema_calls": 0}
+        checkpoint_config = CheckpointConfig.get_config()
+        self.checkpoints = (
+            CheckpointStore(checkpoint_config["path"], checkpoint_config["max_runs"]) if checkpoint_config["enabled"] else None
+        )
+        self.current_run_id = None
+        llm_cache_config = LlmCacheConfig.get_config()
+        self.llm_cache = LlmCache(llm_cache_config["path"], llm_cache_config["max_bytes"]) if llm_cache_config["enabled"] else None
 
 
-    async def initialize(self,is_docker: bool):
-        """Initialize the MCP server and agent"""
+    async def initialize(self,is_docker: bool, mcp_workers: Optional[list] = None):
+        """Initialize the MCP server and agent, mcp_workers are server processes the caller already started"""
         logger.info("🚀 Initializing MCP server...")
 
-        # Initialize LLM
-        self.ollama_config = OllamaConfig.get_config(is_docker)
-        print(f"config: {self.ollama_config}")
-        self.llm = Ollama(
-            model= self.ollama_config["model"],
-            base_url= self.ollama_config["base_url"],
-            context_window= self.ollama_config["context_window"],
-            max_tokens= self.ollama_config["max_tokens"],
-            temperature= self.ollama_config["temperature"],
-            request_timeout= self.ollama_config["request_timeout"],
-            thinking=False
-        )
-        assert self.llm.metadata.is_function_calling_model, "LLM must be a function calling model"
+        # Start MCP server workers first, they load while the LLM client is set up
+        server_config = McpServerConfig.get_config()
+        self.mcp_workers = mcp_workers if mcp_workers is not None else start_mcp_workers(server_config)
 
-        # Start MCP server
-        subprocess.Popen([sys.executable, "mcp/mcp_server.py"])
-        await asyncio.sleep(2)  # Give server time to start
+        warmup = None
+        try:
+            # The Ollama and MCP client libraries are only needed from here on, importing them
+            # lazily keeps them off the startup path (see python scripts/benchmark.py startup)
+            from llama_index.llms.ollama import Ollama
+            from llama_index.tools.mcp import McpToolSpec
+            from ollama import AsyncClient
+
+            # Initialize LLM
+            self.ollama_config = OllamaConfig.get_config(is_docker)
+            print(f"config: {self.ollama_config}")
+            # One HTTP client for the whole session so every LLM call reuses the pooled connection
+            llm_http_client = AsyncClient(
+                host=self.ollama_config["base_url"],
+                timeout=float(self.ollama_config["request_timeout"]),
+                limits=httpx.Limits(keepalive_expiry=self.ollama_config["http_keepalive_expiry"]),
+            )
+            self.llm = Ollama(
+                model= self.ollama_config["model"],
+                base_url= self.ollama_config["base_url"],
+                context_window= self.ollama_config["context_window"],
+                max_tokens= self.ollama_config["max_tokens"],
+                temperature= self.ollama_config["temperature"],
+                request_timeout= self.ollama_config["request_timeout"],
+                keep_alive= self.ollama_config["keep_alive"],
+                additional_kwargs= self.ollama_config["additional_kwargs"],
+                async_client= llm_http_client,
+                thinking=False
+            )
+            assert self.llm.metadata.is_function_calling_model, "LLM must be a function calling model"
+
+            # Load the model while the MCP server starts, instead of on the first user request
+            warmup = asyncio.create_task(self.warmup_llm()) if self.ollama_config["warmup"] else None
+
+            # Wait for the MCP server workers
+            self.dispatcher = McpDispatcher(server_config["urls"])
+            await self.dispatcher.wait_until_healthy(server_config["startup_timeout"])
+            self.health_monitor = asyncio.create_task(self.dispatcher.monitor_health(server_config["health_check_interval"]))
+            logger.info(f"🔌 {len(server_config['urls'])} MCP server worker(s) ready: {server_config['urls']}")
         
-        # Initialize MCP client and tools
-        self.mcp_client = BasicMCPClient("http://127.0.0.1:8000/sse")
-        mcp_tools = McpToolSpec(client=self.mcp_client)
-        self.tools = await mcp_tools.to_tool_list_async()
-        self.tools_dict = {tool.metadata.get_name():tool  for tool in self.tools}
+            # Initialize tools, every worker serves the same ones
+            mcp_tools = McpToolSpec(client=self.dispatcher.clients[0])
+            all_tools = await mcp_tools.to_tool_list_async()
+            self.tools = [tool for tool in all_tools if tool.metadata.get_name() not in INTERNAL_TOOLS]
+            self.tools_dict = {tool.metadata.get_name():tool  for tool in self.tools}
+
+            # Debug: Print available tools
+            logger.info(f"🔧 Available tools: {self.tools_dict.keys()}")
+
+            if warmup:
+                await warmup
+
+            logger.info("✅ Database Workflow initialized successfully!")
+        except BaseException:
+            # Nobody else stops the workers of a workflow that never came up
+            if warmup:
+                warmup.cancel()
+            self.stop_mcp_workers()
+            raise
+
+    def stop_mcp_workers(self):
+        """Stops the health monitor and terminates the MCP server worker processes"""
+        if self.health_monitor:
+            self.health_monitor.cancel()
+        if self.mcp_workers:
+            stop_mcp_workers(self.mcp_workers)
+
+    async def measure_first_token_latency(self) -> float:
+        """Time until the model returns its first token for a one-token request"""
+        started = time.perf_counter()
+        await self.llm.async_client.chat(
+            model=self.llm.model,
+            messages=[{"role": "user", "content": "ping"}],
+            # Same options as real requests, Ollama reloads the model when num_ctx changes
+            options={**self.llm._model_kwargs, "num_predict": 1},
+            keep_alive=self.llm.keep_alive,
+        )
+        return time.perf_counter() - started
 
-        # Debug: Print available tools
-        logger.info(f"🔧 Available tools: {self.tools_dict.keys()}")
+    async def warmup_llm(self):
+        """Loads the model on the Ollama server and reports cold and warm first-token latency"""
+        try:
+            cold = await self.measure_first_token_latency()
+            warm = await self.measure_first_token_latency()
+            logger.info(f"🔥 Model {self.llm.model} loaded: cold first token {cold:.2f}s, warm first token {warm:.2f}s")
+        except Exception as e:
+            logger.warning(f"⚠️ Model warmup failed, it will load on the first request instead: {e}")
 
-        logger.info("✅ Database Workflow initialized successfully!")
+    async def get_table_catalog(self) -> set[str]:
+        """Table names from list_tables, cached for TABLE_CATALOG_TTL_SECONDS"""
+        if self.table_catalog is None or time.monotonic() - self.table_catalog_loaded_at > self.prefetch_config["catalog_ttl_seconds"]:
+            result = json.loads(tool_result_text(await self.dispatcher.call_tool("list_tables", {})))
+            self.table_catalog = set(result.get("tables", []))
+            self.table_catalog_loaded_at = time.monotonic()
+        return self.table_catalog
+
+    async def prefetch_schemas(self, user_input: str) -> tuple[list, list[str]]:
+        """
+        Fetches the schemas of tables named in the request up front and returns them as
+        get_table_schema action/observation steps, saving the LLM turn that would ask for them
+        """
+        self.prefetch_stats["requests"] += 1
+        try:
+            tables = mentioned_tables(user_input, await self.get_table_catalog())[:self.prefetch_config["max_tables"]]
+            results = await asyncio.gather(
+                *(self.dispatcher.call_tool("get_table_schema", {"table_name": table}) for table in tables)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Schema prefetch skipped: {e}")
+            return [], []
+
+        steps = []
+        for table, result in zip(tables, results):
+            steps.append(ActionReasoningStep(
+                thought=f"I need the schema of the {table} table.",
+                action="get_table_schema",
+                action_input={"table_name": table},
+            ))
+            steps.append(ObservationReasoningStep(observation=tool_result_text(result)))
+
+        if tables:
+            self.prefetch_stats["prefetched_requests"] += 1
+            self.prefetch_stats["schemas_prefetched"] += len(tables)
+        logger.info(f"📐 Prefetched schemas: {tables or 'none'} "
+                    f"(used in {self.prefetch_stats['prefetched_requests']}/{self.prefetch_stats['requests']} requests, "
+                    f"{self.prefetch_stats['redundant_schema_calls']} redundant get_table_schema calls)")
+        return steps, tables
+
+    async def checkpoint(self, workflow_context: Context, step_name: str):
+        """Durably stores the run's reasoning steps and memory after a workflow step"""
+        if not self.checkpoints:
+            return
+        self.checkpoints.save(
+            await workflow_context.store.get("run_id"),
+            step_name,
+            await workflow_context.store.get("steps", default=[]),
+            self.memory.get_all(),
+            {
+                "prefetched_tables": await workflow_context.store.get("prefetched_tables", default=[]),
+                "llm_calls": await workflow_context.store.get("llm_calls", default=0),
+            },
+        )
+
+    def llm_cache_key(self, prompt_digest: str) -> str:
+        """Cache key of a prompt for the configured model and sampling parameters"""
+        return cache_key(prompt_digest, self.llm.model, {
+            "temperature": self.llm.temperature,
+            "max_tokens": self.ollama_config["max_tokens"],
+            "context_window": self.llm.context_window,
+            "additional_kwargs": self.llm.additional_kwargs,
+        })
+
+    async def cancel_running_queries(self):
+        """Stops any query still running on the server workers, e.g. after the workflow timed out"""
+        for url, result in zip(self.dispatcher.urls, await self.dispatcher.broadcast("cancel_running_queries", {})):
+            logger.info(f"🛑 {url}: {tool_result_text(result) if hasattr(result, 'content') else result}")
+
+    async def get_query_stats(self) -> str:
+        """Returns each server worker's executed/rejected/timed out/cancelled query counters"""
+        results = await self.dispatcher.broadcast("get_query_stats", {})
+        return "\n".join(
+            f"{url}: {tool_result_text(result) if hasattr(result, 'content') else result}"
+            for url, result in zip(self.dispatcher.urls, results)
+        )
 
     @step
-    async def new_user_msg(self, workflow_context : Context, ev : StartEvent) -> PrepEvent:
-        user_input = ev.input
+    async def new_user_msg(self, workflow_context : Context, ev : StartEvent) -> PrepEvent | ToolCallEvent:
+        """
+        Starts a run for ev.input. With ev.resume_run_id it instead continues an interrupted run from its
+        last checkpoint, and with ev.replay_run_id it re-runs a recorded run reusing its LLM outputs.
+        """
+        resume_run_id = ev.get("resume_run_id")
+        if resume_run_id:
+            return await self.resume_run(workflow_context, resume_run_id)
+
+        replay_run_id = ev.get("replay_run_id")
+        user_input = ev.get("input")
+        if replay_run_id:
+            if not self.checkpoints:
+                raise ValueError("Replaying a run needs its recorded checkpoints, set CHECKPOINTS=true")
+            replayed_run = self.checkpoints.get_run(replay_run_id)
+            if not replayed_run:
+                raise ValueError(f"No recorded run {replay_run_id} to replay")
+            user_input = replayed_run["user_input"]
+            # Start from the memory the recorded run started with, so the prompts match its prompts
+            self.memory.reset()
+            self.memory.put_messages(self.checkpoints.start_messages(replay_run_id))
+
+        run_id = uuid.uuid4().hex
+        self.current_run_id = run_id
+        logger.info(f"🏷️ Run {run_id}{f' replaying {replay_run_id}' if replay_run_id else ''}")
+        if self.checkpoints:
+            self.checkpoints.start_run(run_id, user_input, self.memory.get_all(), replay_of=replay_run_id)
+        await workflow_context.store.set("run_id", run_id)
+        await workflow_context.store.set("replay_run_id", replay_run_id)
+        await workflow_context.store.set("llm_calls", 0)
+
         self.memory.put(ChatMessage(role="system", content=SYSTEM_PROMPT))
         self.memory.put(ChatMessage(role="user", content=user_input))  
-        await workflow_context.store.set("steps", [])
+        steps, prefetched_tables = await self.prefetch_schemas(user_input) if self.prefetch_config["enabled"] else ([], [])
+        await workflow_context.store.set("steps", steps)
+        await workflow_context.store.set("prefetched_tables", prefetched_tables)
+        await self.checkpoint(workflow_context, "new_user_msg")
         return PrepEvent()  
 
+    async def resume_run(self, workflow_context: Context, run_id: str) -> PrepEvent | ToolCallEvent:
+        """Restores steps and memory from the run's last checkpoint and continues where it stopped"""
+        checkpoint = self.checkpoints.load_latest(run_id) if self.checkpoints else None
+        if not checkpoint:
+            raise ValueError(f"No checkpoint found for run {run_id}")
+        steps = checkpoint["steps"]
+        if self.checkpoints.get_run(run_id)["status"] == "done" or (steps and isinstance(steps[-1], ResponseReasoningStep)):
+            raise ValueError(f"Run {run_id} already finished, replay it with --replay {run_id} instead")
+
+        self.current_run_id = run_id
+        self.memory.reset()
+        self.memory.put_messages(checkpoint["messages"])
+        await workflow_context.store.set("run_id", run_id)
+        await workflow_context.store.set("replay_run_id", None)
+        await workflow_context.store.set("steps", checkpoint["steps"])
+        await workflow_context.store.set("prefetched_tables", checkpoint["state"]["prefetched_tables"])
+        await workflow_context.store.set("llm_calls", checkpoint["state"]["llm_calls"])
+        self.checkpoints.finish_run(run_id, "running")
+        logger.info(f"⏯️ Resuming run {run_id} after {checkpoint['step_name']} ({len(checkpoint['steps'])} steps)")
+
+        last_step = checkpoint["steps"][-1] if checkpoint["steps"] else None
+        if isinstance(last_step, ActionReasoningStep):
+            # The tool call was requested but its result never checkpointed, run it again
+            return tool_call_event(last_step)
+        return PrepEvent()
+
     @step
     async def prepare_llm_prompt(self, workflow_context: Context, ev : PrepEvent) -> LLMInputEvent:
         """Prepares the react prompt, using the chat history, tools, and current reasoning (if any)"""
@@ -97,9 +345,39 @@ class DatabaseWorkflow(Workflow):
         return LLMInputEvent(input=llm_input)
     
     @step
-    async def invoke_llm(self, ev : LLMInputEvent) -> LLMOutputEvent:
+    async def invoke_llm(self, workflow_context: Context, ev : LLMInputEvent) -> LLMOutputEvent:
         """Handles the LLM output, including tool calls and final response"""
-        llm_output = await self.llm.achat(ev.input)
+        call_index = await workflow_context.store.get("llm_calls", default=0)
+        await workflow_context.store.set("llm_calls", call_index + 1)
+        prompt_digest = prompt_hash(ev.input)
+
+        replay_run_id = await workflow_context.store.get("replay_run_id", default=None)
+        recorded = self.checkpoints.recorded_llm_output(replay_run_id, call_index) if replay_run_id else None
+        if recorded and recorded[0] == prompt_digest:
+            # Replaying: same prompt as in the recorded run, reuse its output instead of calling the LLM
+            logger.info(f"⏭️ Replayed LLM call {call_index} from run {replay_run_id}")
+            return LLMOutputEvent(output=ChatResponse(message=recorded[1]))
+        if replay_run_id:
+            logger.info(f"🔀 LLM call {call_index} diverged from run {replay_run_id}, calling the LLM")
+
+        cached = None
+        if self.llm_cache:
+            key = self.llm_cache_key(prompt_digest)
+            cached = self.llm_cache.get(key)
+            logger.info(f"🗃️ LLM cache {'hit' if cached else 'miss'} ({self.llm_cache.stats()['hit_rate']:.0%} hit rate)")
+        if cached:
+            llm_output = ChatResponse(message=cached)
+        else:
+            llm_output = await self.llm.achat(ev.input)
+            if self.llm_cache:
+                self.llm_cache.put(key, llm_output.message)
+        if self.checkpoints:
+            self.checkpoints.record_llm_output(await workflow_context.store.get("run_id"), call_index, prompt_digest, llm_output.message)
+
+        # Ollama reports how long it spent loading the model, a long load means it was unloaded while idle
+        load_seconds = ((llm_output.raw or {}).get("load_duration") or 0) / 1e9
+        if load_seconds > 1:
+            logger.info(f"⏳ Model was reloaded ({load_seconds:.1f}s), consider a longer OLLAMA_KEEP_ALIVE")
 
         return LLMOutputEvent(output=llm_output)         
         
@@ -117,18 +395,20 @@ class DatabaseWorkflow(Workflow):
             step = ReActOutputParser().parse(ev.output.message.content)
             steps = await workflow_context.store.get("steps", default=[])
             steps.append(step)
+            await self.checkpoint(workflow_context, "handle_llm_input")
 
             if step.is_done:
                 # final step of the reasoning process
+                if self.checkpoints:
+                    self.checkpoints.finish_run(await workflow_context.store.get("run_id"), "done")
                 return StopEvent(result=step.response)
             elif isinstance(step, ActionReasoningStep):
                 # Tool call are requested by the LLM
                 logger.info(f"🔍 Action: {step.get_content()}")
-                return ToolCallEvent(tool_calls=[ToolSelection(
-                                                tool_id="Tool_ID",
-                                                tool_name=step.action, 
-                                                tool_kwargs=step.action_input)
-                                                ])
+                if step.action == "get_table_schema" and step.action_input.get("table_name") in await workflow_context.store.get("prefetched_tables", default=[]):
+                    # The prefetch did not save this turn
+                    self.prefetch_stats["redundant_schema_calls"] += 1
+                return tool_call_event(step)
             elif isinstance(step, ObservationReasoningStep):
                 # No tool call are requested by the LLM
                 logger.info(f"🔍 Observation: {step.observation}")
@@ -137,6 +417,7 @@ class DatabaseWorkflow(Workflow):
             error_step = ObservationReasoningStep(observation=f"Error parsing LLM output: {e}")
             steps = await workflow_context.store.get("steps", default=[])
             steps.append(error_step)
+            await self.checkpoint(workflow_context, "handle_llm_input")
         
         return PrepEvent()
 
@@ -149,10 +430,13 @@ class DatabaseWorkflow(Workflow):
 
         for tool_call in tool_calls:
             logger.info(f"🔍 Handling tool call: {tool_call.tool_name}")
+            if tool_call.tool_name in CATALOG_CHANGING_TOOLS:
+                self.table_catalog = None
             if tool := self.tools_dict.get(tool_call.tool_name):
                 try:
-                    tool_call_result = tool(** tool_call.tool_kwargs)
-                    step = ObservationReasoningStep(observation=tool_call_result.content)
+                    # Sent to the least busy server worker, and awaited so a workflow timeout cancels the pending call
+                    tool_call_result = await self.dispatcher.call_tool(tool_call.tool_name, tool_call.tool_kwargs)
+                    step = ObservationReasoningStep(observation=tool_result_text(tool_call_result))
                     logger.info(f"🔍 Tool call result: {step.observation}")
                 except Exception as e:
                     step = ObservationReasoningStep(observation=f"Error calling tool {tool.metadata.get_name}: {e}")
@@ -163,6 +447,7 @@ class DatabaseWorkflow(Workflow):
             
             steps = await ctx.store.get("steps", default=[])
             steps.append(step)
+            await self.checkpoint(ctx, "handle_tool_calls")
             
         return PrepEvent()
 